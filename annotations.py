@@ -0,0 +1,112 @@
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from storage import journal_lock
+from trade_index import trade_key_hashes
+
+# Notes and Ratio edited in the dashboard live next to the journal, keyed by
+# trade ID (the trade-key hash as 16 hex digits), and are laid over the
+# journal's own columns when trades are shown. Each edit appends one record
+# to a local log and uploads only that record, so the journal is never
+# rewritten for a note. The newest record per trade wins; an empty string
+# clears a value the journal has. The log is shared by every session, so it
+# is read, appended to and compacted under its own lock.
+COMPACT_MIN_RECORDS = 1000
+
+
+def annotations_path(journal_path):
+    return f"{journal_path}.notes.jsonl"
+
+
+def annotations_lock(journal_path):
+    return journal_lock(annotations_path(journal_path))
+
+
+def trade_ids(df):
+    return [f"{h:016x}" for h in trade_key_hashes(df)]
+
+
+def annotations_version(journal_path):
+    # Changes with every local edit or synced record; part of cache keys.
+    try:
+        stat = os.stat(annotations_path(journal_path))
+    except FileNotFoundError:
+        return None
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def _read_records(journal_path):
+    try:
+        with annotations_lock(journal_path), open(annotations_path(journal_path)) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def read_annotations(journal_path):
+    # Latest record per trade, indexed by the uint64 trade-key hash.
+    latest = {}
+    for record in _read_records(journal_path):
+        current = latest.get(record["id"])
+        if current is None or record["updated"] >= current["updated"]:
+            latest[record["id"]] = record
+    if not latest:
+        return pd.DataFrame({"Notes": [], "Ratio": [], "updated": []}, index=pd.Index([], dtype=np.uint64))
+    records = pd.DataFrame(list(latest.values()))
+    records.index = pd.Index([int(i, 16) for i in records["id"]], dtype=np.uint64)
+    return records.rename(columns={"notes": "Notes", "ratio": "Ratio"})[["Notes", "Ratio", "updated"]]
+
+
+def make_record(trade_id, notes, ratio):
+    return {"id": trade_id, "notes": notes, "ratio": ratio, "updated": int(time.time() * 1000)}
+
+
+def append_records(journal_path, records):
+    # One line per record, flushed to disk before returning.
+    if not records:
+        return
+    with annotations_lock(journal_path):
+        with open(annotations_path(journal_path), "a") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        compact_annotations(journal_path)
+
+
+def compact_annotations(journal_path):
+    # Rewrite the log with one record per trade once most lines are stale.
+    with annotations_lock(journal_path):
+        records = _read_records(journal_path)
+        latest = read_annotations(journal_path)
+        if len(records) < COMPACT_MIN_RECORDS or len(records) < 2 * len(latest):
+            return
+        path = annotations_path(journal_path)
+        with open(path + ".tmp", "w") as f:
+            for trade_id, row in latest.iterrows():
+                f.write(json.dumps({"id": f"{trade_id:016x}", "notes": row["Notes"], "ratio": row["Ratio"],
+                                    "updated": int(row["updated"])}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+
+def apply_annotations(trades, annotations):
+    # The trades with edited Notes/Ratio laid over the journal's values.
+    if trades.empty or annotations.empty:
+        return trades
+    hashes = trade_key_hashes(trades)
+    found = annotations.index.get_indexer(hashes)
+    if not (found >= 0).any():
+        return trades
+    trades = trades.copy()
+    hit = found >= 0
+    for column in ("Notes", "Ratio"):
+        values = annotations[column].to_numpy(dtype=object)[found[hit]]
+        edited = pd.notna(values)
+        current = np.array(trades[column].astype(object), dtype=object)
+        current[np.flatnonzero(hit)[edited]] = [value if value != "" else None for value in values[edited]]
+        trades[column] = current
+    return trades
@@ -1,19 +1,5 @@
 import streamlit as st
-import pandas as pd
-import plotly.graph_objects as go
 import os
-from datetime import timedelta
-import math
-from datetime import datetime
-from tradingjournal import update_trading_journal, download_from_supabase
-from filters import apply_date_filter
-from metrics import calculate_overall_stats, calculate_filtered_stats
-from visuals import plot_equity, plot_drawdown
-from components import generate_stats_html
-from latest import render_latest_trades
-from history import render_trade_history
-from filter_chips import render_filter_chips
-
 
 st.set_page_config(page_title="Trading Journal Dashboard.", layout="wide")
 
@@ -21,6 +7,27 @@ with open("styles.css") as f:
     st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
 st.markdown(open("header_nav.html").read(), unsafe_allow_html=True)
 
+# The page frame is sent before the journal modules load; modules used by a
+# single section are imported in that section.
+from tradingjournal import update_trading_journal, sync_master_journal, get_upload_queue, save_annotation
+from storage import JOURNAL_FILE, journal_token
+from snapshot import current_snapshot, swap_snapshot
+from memo import render_cache
+from daily_series import load_daily_series, read_daily_series, daily_window
+from stats_engine import StatsEngine
+from components import generate_stats_html
+from sql_store import SQL_STORE_ENABLED, JournalStore, SqlTradeView
+from annotations import annotations_version, read_annotations
+from filter_chips import render_filter_chips
+from profile_panel import finish_run, render_profile_panel
+import profiling
+from profiling import span, frame_size
+
+# --- Profiling (opt-in) ---
+# The toggle only affects this session; JOURNAL_PROFILE=1 sets its default.
+profiling_on = st.sidebar.toggle("⏱️ Profile dashboard", value=profiling.enabled, key="profiling")
+profiling.begin_run(on=profiling_on)
+
 # --- Content Wrapper ---
 st.markdown('<div class="content">', unsafe_allow_html=True)
 
@@ -28,6 +35,10 @@ st.markdown('<div class="content">', unsafe_allow_html=True)
 st.sidebar.header("📤 Upload New Trades")
 uploaded_file = st.sidebar.file_uploader("Upload latest_trades.xlsx", type=["xlsx"])
 
+pending_uploads = len(get_upload_queue().pending())
+if pending_uploads:
+    st.sidebar.caption(f"⏳ {pending_uploads} journal upload(s) waiting to sync")
+
 if "prev_uploaded_file" not in st.session_state:
     st.session_state.prev_uploaded_file = None
 
@@ -38,29 +49,127 @@ if uploaded_file is not None:
         temp_file_path = "uploaded_latest_trades.xlsx"
         with open(temp_file_path, "wb") as f:
             f.write(uploaded_file.getbuffer())
-        update_trading_journal(temp_file_path, "trading_journal.xlsx")
-        st.cache_data.clear()
+        previous_version = journal_token(JOURNAL_FILE) if os.path.exists(JOURNAL_FILE) else None
+        new_version = update_trading_journal(temp_file_path, JOURNAL_FILE)
+        if new_version != previous_version:
+            # Only the entries rendered from the replaced journal are dropped.
+            render_cache.invalidate(previous_version)
+            swap_snapshot(JOURNAL_FILE, new_version)
+        finish_run()
         st.rerun()  # 
         st.stop()
 # --- Load Data ---
-@st.cache_data
-def load_data(file):
-    download_from_supabase(local_path=file)
-    df = pd.read_excel(file, parse_dates=["Date"])
-    # Use the same date format as saved in tradingjournal.py
-    df = df.dropna(subset=["Date"])
-    df = df[df["Total Position PnL"].notna()]
+# Everything below is keyed by the journal version (the token stamped into
+# each journal write), so reruns and chip clicks are cache lookups. Spans
+# inside cached loaders only appear when the cache missed.
+def load_data(file, version):
+    # The process-wide read-only snapshot; sessions share it without copies.
+    return current_snapshot(file, version).trades
 
+@st.cache_resource(max_entries=2)
+def load_daily(file, version):
+    # Daily equity/drawdown series, shared by both charts and every window.
+    with span("daily series (miss)"):
+        return load_daily_series(file, load_data(file, version), version)
 
-    return df
+@st.cache_resource(max_entries=2)
+def load_stats_engine(file, version):
+    # Shared read-only engine per journal write; answers every stats window.
+    with span("stats engine (miss)"):
+        return StatsEngine(load_data(file, version))
 
-# Clear cache on first run to ensure fresh data
-if "first_load" not in st.session_state:
-    st.cache_data.clear()
+@st.cache_resource(max_entries=2)
+def load_trade_view(file, version):
+    # Pre-sorted trades behind the Full History table.
+    from history import TradeView
+    with span("trade view (miss)"):
+        return TradeView(load_data(file, version))
+
+# With JOURNAL_SQL_STORE=1 the views below query an indexed SQLite copy of
+# the journal instead of holding the whole frame in memory.
+@st.cache_resource(max_entries=1)
+def load_store(file, version):
+    with span("sql store (miss)"):
+        return JournalStore.open(file)
+
+@st.cache_resource(max_entries=2)
+def load_store_daily(file, version):
+    with span("daily series (miss)"):
+        daily = read_daily_series(file, version)
+        return daily if daily is not None else load_store(file, version).daily_rollup()
+
+@st.cache_resource(max_entries=1)
+def load_sql_trade_view(file, version):
+    with span("trade view (miss)"):
+        return SqlTradeView(load_store(file, version))
+
+@st.cache_data(max_entries=2)
+def load_annotations(file, notes_version):
+    # Edited Notes/Ratio, joined onto the trades on screen.
+    return read_annotations(file)
+
+@st.cache_resource(max_entries=2)
+def load_cube(file, version):
+    # Calendar rollups stored by the last ingest, or rebuilt for this version.
+    from rollups import cube_from_days, load_rollup_cube, read_rollup_cube
+    with span("rollup cube (miss)"):
+        if SQL_STORE_ENABLED:
+            cube = read_rollup_cube(file, version)
+            return cube if cube is not None else cube_from_days(load_store(file, version).day_rollup())
+        return load_rollup_cube(file, load_data(file, version), version)
+
+@st.cache_resource(max_entries=8)
+def load_rolling(file, version, by, window):
+    # Every rolling metric for one window; the metric picker is a column lookup.
+    from rolling import rolling_metrics, trade_arrays
+    with span("rolling metrics (miss)", by=by, window=window):
+        if SQL_STORE_ENABLED:
+            dates, pnl = load_store(file, version).trade_series()
+        else:
+            dates, pnl = trade_arrays(load_data(file, version))
+        return rolling_metrics(dates, pnl, window, by)
+
+@st.cache_data(max_entries=8)
+def load_risk(file, version, source, paths, horizon, block, ruin_loss):
+    # Only the summary is cached; the per-path arrays are dropped.
+    from risk import risk_table, simulate
+    with span("risk simulation (miss)", paths=paths):
+        if source == "Daily":
+            pnl = load_store_daily(file, version) if SQL_STORE_ENABLED else load_daily(file, version)
+            pnl = pnl["Total Position PnL"].to_numpy()
+        elif SQL_STORE_ENABLED:
+            pnl = load_store(file, version).pnl_series()
+        else:
+            pnl = load_data(file, version)["Total Position PnL"].to_numpy()
+        result = simulate(pnl, paths, horizon, block, ruin_loss=ruin_loss)
+        if result is None:
+            return None
+        return {
+            "table": risk_table(result),
+            "risk_of_ruin": result["risk_of_ruin"],
+            "loss_probability": result["loss_probability"],
+        }
+
+# Sync with the bucket once per session to pick up other uploads. With a
+# local journal on disk the page is drawn from it first and synced after.
+if "first_load" not in st.session_state and not os.path.exists(JOURNAL_FILE):
+    sync_master_journal(JOURNAL_FILE)
     st.session_state.first_load = True
 
-df = load_data("trading_journal.xlsx")
-print(f"loaded data {df}")
+with span("load") as s:
+    version = journal_token(JOURNAL_FILE)
+    if SQL_STORE_ENABLED:
+        # The store answers the same stats queries as the engine.
+        stats_engine = load_store(JOURNAL_FILE, version)
+        df = stats_engine.latest(5)
+        daily = load_store_daily(JOURNAL_FILE, version)
+    else:
+        df = load_data(JOURNAL_FILE, version)
+        daily = load_daily(JOURNAL_FILE, version)
+        stats_engine = load_stats_engine(JOURNAL_FILE, version)
+    notes_version = annotations_version(JOURNAL_FILE)
+    annotations = load_annotations(JOURNAL_FILE, notes_version)
+    s.set(version=version, **frame_size(df))
 
 st.title("📘 Trading Journal")
 
@@ -69,38 +178,204 @@ col1, col2 = st.columns(2)
 with col1:
     st.subheader(f"Stats for")
     selected_filter = render_filter_chips(session_key="stats_filter")
-    filtered_df = apply_date_filter(df, selected_filter)
-    stats = calculate_filtered_stats(filtered_df, df)
-    st.markdown(generate_stats_html(stats), unsafe_allow_html=True)
+    with span("stats", period=selected_filter):
+        stats_html = render_cache.get(version, ("stats", selected_filter),
+                                      lambda: generate_stats_html(stats_engine.period_stats(selected_filter)))
+        st.markdown(stats_html, unsafe_allow_html=True)
 
 with col2:
     st.markdown('<div id="summary">', unsafe_allow_html=True)
     st.subheader("Stats Summary")
-    overall_stats = calculate_overall_stats(df)
-    st.markdown(generate_stats_html(overall_stats), unsafe_allow_html=True)
+    with span("stats", period="overall"):
+        overall_html = render_cache.get(version, ("stats", "overall"),
+                                        lambda: generate_stats_html(stats_engine.overall_stats()))
+        st.markdown(overall_html, unsafe_allow_html=True)
 
 # --- Charts ---
+from downsample import CHART_POINT_BUDGET, downsample_daily
+from visuals import plot_drawdown, plot_equity
+
 col_chart1, col_chart2 = st.columns(2)
 with col_chart1:
     st.subheader("\U0001F4C8 Equity Curve")
     chart_filter = render_filter_chips(session_key="equity_curve_filter", default="All Time")
-    eq_df = apply_date_filter(df, chart_filter)
+    eq_daily = daily_window(daily, chart_filter)
     st.markdown('<div id="equity">', unsafe_allow_html=True)
-    st.plotly_chart(plot_equity(eq_df), use_container_width=True)
+
+    def build_equity_chart():
+        points = downsample_daily(eq_daily, CHART_POINT_BUDGET, "Cumulative PnL")
+        return plot_equity(points, webgl=len(points) < len(eq_daily)), len(points)
+
+    with span("equity chart", period=chart_filter) as s:
+        equity_fig, equity_points = render_cache.get(version, ("equity", chart_filter, CHART_POINT_BUDGET), build_equity_chart)
+        st.plotly_chart(equity_fig, use_container_width=True)
+        s.set(rows=equity_points)
+    st.caption(f"{equity_points} of {len(eq_daily)} points plotted")
 
 with col_chart2:
     st.markdown('<div id="drawdown">', unsafe_allow_html=True)
     st.subheader("\U0001F4C9 Drawdown Curve")
-    st.plotly_chart(plot_drawdown(eq_df), use_container_width=True)
+
+    def build_drawdown_chart():
+        points = downsample_daily(eq_daily, CHART_POINT_BUDGET, "Drawdown")
+        return plot_drawdown(points, webgl=len(points) < len(eq_daily)), len(points)
+
+    with span("drawdown chart", period=chart_filter) as s:
+        drawdown_fig, drawdown_points = render_cache.get(version, ("drawdown", chart_filter, CHART_POINT_BUDGET), build_drawdown_chart)
+        st.plotly_chart(drawdown_fig, use_container_width=True)
+        s.set(rows=drawdown_points)
+    st.caption(f"{drawdown_points} of {len(eq_daily)} points plotted")
+
+# --- Rolling Metrics ---
+from downsample import downsample_series
+from rolling import BY, ROLLING_METRICS
+from visuals import plot_rolling
+
+st.markdown('<div id="rolling">', unsafe_allow_html=True)
+st.subheader("📐 Rolling Metrics")
+rolling_cols = st.columns([1, 1, 2])
+rolling_by = rolling_cols[0].radio("Window of last", BY, horizontal=True, key="rolling_by")
+rolling_window = int(rolling_cols[1].number_input(rolling_by, min_value=2, max_value=5000, value=50, step=10,
+                                                  key="rolling_window"))
+rolling_metric = rolling_cols[2].selectbox("Metric", ROLLING_METRICS, key="rolling_metric")
+
+def build_rolling_chart():
+    rolling = load_rolling(JOURNAL_FILE, version, rolling_by, rolling_window)
+    rolling = rolling[rolling[rolling_metric].notna()]
+    points = downsample_series(rolling, CHART_POINT_BUDGET, rolling_metric)
+    equity = downsample_daily(daily, CHART_POINT_BUDGET)
+    return plot_rolling(points, rolling_metric, equity, webgl=len(points) < len(rolling)), len(points)
+
+with span("rolling chart", by=rolling_by, window=rolling_window, metric=rolling_metric) as s:
+    rolling_fig, rolling_points = render_cache.get(
+        version, ("rolling", rolling_by, rolling_window, rolling_metric, CHART_POINT_BUDGET), build_rolling_chart)
+    st.plotly_chart(rolling_fig, use_container_width=True)
+    s.set(rows=rolling_points)
+if not rolling_points:
+    st.caption(f"Fewer than {rolling_window} {rolling_by.lower()} of history so far.")
+
+# --- Per-Instrument Breakdown ---
+from instruments import TABLE_HEIGHT, breakdown_table, instrument_breakdown, max_drawdown_window
+
+st.markdown('<div id="instruments">', unsafe_allow_html=True)
+st.subheader("🧩 By Instrument")
+
+def build_instrument_table():
+    if SQL_STORE_ENABLED:
+        window = max_drawdown_window(daily)
+        return breakdown_table(stats_engine.instrument_rollup(window), window)
+    return instrument_breakdown(df, daily)
+
+with span("instruments") as s:
+    instrument_table = render_cache.get(version, ("instruments",), build_instrument_table)
+    # Click a column header to sort.
+    st.dataframe(
+        instrument_table,
+        hide_index=True,
+        use_container_width=True,
+        height=TABLE_HEIGHT,
+        column_config={
+            column: st.column_config.NumberColumn(format="%.2f")
+            for column in instrument_table.columns[4:]
+        },
+    )
+    s.set(rows=len(instrument_table))
+st.caption("Drawdown PnL: PnL booked between the peak and the trough of the deepest drawdown.")
+
+# --- Calendar ---
+from rollups import level_table, period_over_period, period_stats
+from visuals import plot_calendar_heatmap
+
+st.markdown('<div id="calendar">', unsafe_allow_html=True)
+st.subheader("🗓️ Calendar")
+cube = load_cube(JOURNAL_FILE, version)
+day_table = level_table(cube, "day")
+if day_table.empty:
+    st.info("No trades yet.")
+else:
+    cal_col1, cal_col2 = st.columns([3, 2])
+    with cal_col1:
+        years = sorted(day_table.index.year.unique(), reverse=True)
+        heatmap_year = st.selectbox("Year", years, key="calendar_year")
+        with span("calendar heatmap", year=heatmap_year):
+            heatmap = render_cache.get(version, ("calendar", heatmap_year),
+                                       lambda: plot_calendar_heatmap(day_table, heatmap_year))
+            st.plotly_chart(heatmap, use_container_width=True)
+    with cal_col2:
+        level = st.radio("Period", ["week", "month", "year"], index=1, horizontal=True,
+                         format_func=str.title, key="calendar_level")
+        first_day, last_day = day_table.index[0].date(), day_table.index[-1].date()
+        period_day = st.date_input(f"{level.title()} containing", value=last_day,
+                                   min_value=first_day, max_value=last_day, key="calendar_day")
+        stats = period_stats(cube, level, period_day)
+        if stats is None:
+            st.caption(f"No trades in that {level}.")
+        else:
+            period_metrics = st.columns(3)
+            period_metrics[0].metric("PnL", f"{stats['pnl']:.2f}")
+            period_metrics[1].metric("Trades", stats["trades"])
+            period_metrics[2].metric("Win Rate", f"{stats['win_rate']:.1f}%")
+        with span("period over period", level=level):
+            table = render_cache.get(version, ("period_over_period", level),
+                                     lambda: period_over_period(cube, level))
+            st.dataframe(table.round(2), hide_index=True, use_container_width=True)
+
+# --- Risk Simulation ---
+from risk import STARTING_BALANCE
+
+st.markdown('<div id="risk">', unsafe_allow_html=True)
+st.subheader("🎲 Risk Simulation")
+with st.form("risk_form"):
+    risk_cols = st.columns(5)
+    risk_source = risk_cols[0].selectbox("Resample", ["Trades", "Daily"])
+    risk_paths = risk_cols[1].selectbox("Paths", [10_000, 100_000, 1_000_000], format_func="{:,}".format)
+    risk_horizon = risk_cols[2].number_input("Horizon (steps)", min_value=1, value=250, step=50)
+    risk_block = risk_cols[3].number_input("Block length", min_value=1, value=1,
+                                           help="1 resamples single steps; longer blocks keep streaks together")
+    risk_ruin = risk_cols[4].number_input("Ruin at loss of", min_value=1.0, value=STARTING_BALANCE, step=10.0)
+    if st.form_submit_button("Run simulation"):
+        st.session_state.risk_params = (risk_source, risk_paths, int(risk_horizon), int(risk_block), float(risk_ruin))
+
+if "risk_params" in st.session_state:
+    with span("risk"):
+        risk = load_risk(JOURNAL_FILE, version, *st.session_state.risk_params)
+    if risk is None:
+        st.info("No trades to simulate yet.")
+    else:
+        risk_metrics = st.columns(2)
+        risk_metrics[0].metric("Risk of ruin", f"{risk['risk_of_ruin']:.1%}")
+        risk_metrics[1].metric("Chance of ending at a loss", f"{risk['loss_probability']:.1%}")
+        st.dataframe(risk["table"].round(2), hide_index=True, use_container_width=True)
+        source, paths, horizon, block, ruin_loss = st.session_state.risk_params
+        st.caption(f"{paths:,} bootstrapped paths of {horizon} {source.lower()} steps, block length {block}.")
 
 # --- Latest 5 Trades Section ---
+from latest import render_latest_trades
+
 st.markdown('<div id="latest">', unsafe_allow_html=True)
 st.subheader("🧾 Latest 5 Trades")
-render_latest_trades(df)
+with span("latest trades"):
+    render_latest_trades(df, annotations)
 
 # --- Full History Table Section ---
+from history import render_trade_history
+
 st.markdown('<div id="history">', unsafe_allow_html=True)
 st.subheader("📜 Full History")
-render_trade_history(df)
+with span("history"):
+    view = load_sql_trade_view(JOURNAL_FILE, version) if SQL_STORE_ENABLED else load_trade_view(JOURNAL_FILE, version)
+    render_trade_history(view, version, annotations, notes_version,
+                         save_note=lambda trade_id, notes, ratio: save_annotation(JOURNAL_FILE, trade_id, notes, ratio))
+
+st.markdown('</div>', unsafe_allow_html=True)
+
+if "first_load" not in st.session_state:
+    st.session_state.first_load = True
+    sync_master_journal(JOURNAL_FILE)
+    if journal_token(JOURNAL_FILE) != version or annotations_version(JOURNAL_FILE) != notes_version:
+        finish_run()
+        st.rerun()
 
-st.markdown('</div>', unsafe_allow_html=True)
\ No newline at end of file
+profile_run = finish_run()
+if profiling_on:
+    render_profile_panel(profile_run)
\ No newline at end of file
@@ -0,0 +1,154 @@
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+# Journal storage is pluggable: anything with from_(bucket) returning an
+# object with list/download/upload/remove (the Supabase bucket API) works.
+# JOURNAL_BACKEND picks one ("supabase", the default, or "local"). The local
+# folder is only ever used when asked for, so a deployment missing its
+# Supabase settings fails instead of keeping journals in the container.
+BACKEND_ENV = "JOURNAL_BACKEND"
+LOCAL_BUCKET_DIR = os.environ.get("JOURNAL_BUCKET_DIR", ".journal_bucket")
+_storage = None
+_storage_lock = threading.Lock()
+
+
+class LocalBucket:
+    """A directory that answers the subset of the Supabase bucket API we use.
+
+    Stands in for ``supabase.storage.from_(bucket)`` offline and in tests.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, storage_path):
+        return os.path.join(self.root, storage_path)
+
+    def list(self, path="", options=None):
+        folder = self._path(path)
+        if not os.path.isdir(folder):
+            return []
+        search = (options or {}).get("search", "")
+        entries = []
+        for name in sorted(os.listdir(folder)):
+            if search not in name or name.endswith(".tmp"):
+                continue
+            full_path = os.path.join(folder, name)
+            if os.path.isdir(full_path):
+                entries.append({"name": name, "id": None, "metadata": None})
+                continue
+            stat = os.stat(full_path)
+            updated_at = datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc).isoformat()
+            entries.append({
+                "name": name,
+                "id": name,
+                "updated_at": updated_at,
+                "metadata": {"eTag": f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"', "size": stat.st_size},
+            })
+        return entries
+
+    def download(self, storage_path):
+        with open(self._path(storage_path), "rb") as f:
+            return f.read()
+
+    def upload(self, storage_path, file, file_options=None):
+        target = self._path(storage_path)
+        upsert = str((file_options or {}).get("upsert", "false")).lower() == "true"
+        if os.path.exists(target) and not upsert:
+            raise FileExistsError(f"The resource already exists: {storage_path}")
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target) or ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if isinstance(file, (bytes, bytearray)):
+                    f.write(file)
+                elif isinstance(file, str):
+                    with open(file, "rb") as source:
+                        shutil.copyfileobj(source, f)
+                else:
+                    shutil.copyfileobj(file, f)
+            if upsert:
+                os.replace(tmp_path, target)
+            else:
+                # link() fails if the target exists, so of two writers racing
+                # for the same key exactly one wins, across processes too.
+                try:
+                    os.link(tmp_path, target)
+                except FileExistsError:
+                    raise FileExistsError(f"The resource already exists: {storage_path}") from None
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return {"path": storage_path}
+
+    def remove(self, paths):
+        for storage_path in paths:
+            try:
+                os.remove(self._path(storage_path))
+            except FileNotFoundError:
+                pass
+        return []
+
+
+class LocalStorage:
+    # Buckets as folders under `root`, for offline use.
+    def __init__(self, root=LOCAL_BUCKET_DIR):
+        self.root = root
+
+    def from_(self, bucket):
+        return LocalBucket(os.path.join(self.root, bucket))
+
+
+class SupabaseStorage:
+    # The client, and the Supabase libraries themselves, are only loaded on
+    # first use.
+    def __init__(self, url, key):
+        self.url = url
+        self.key = key
+        self.client = None
+
+    def from_(self, bucket):
+        if self.client is None:
+            from supabase import create_client
+            self.client = create_client(self.url, self.key)
+        return self.client.storage.from_(bucket)
+
+
+def _load_env():
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return
+    load_dotenv()
+
+
+def create_storage():
+    _load_env()
+    backend = os.environ.get(BACKEND_ENV) or "supabase"
+    if backend == "supabase":
+        url, key = os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY")
+        if not url or not key:
+            raise RuntimeError(f"SUPABASE_URL and SUPABASE_KEY must be set (or {BACKEND_ENV}=local)")
+        return SupabaseStorage(url, key)
+    if backend == "local":
+        return LocalStorage()
+    raise ValueError(f"Unknown {BACKEND_ENV}: {backend}")
+
+
+def get_storage():
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            _storage = create_storage()
+        return _storage
+
+
+def set_storage(storage):
+    # Plug in another backend, e.g. LocalStorage(tmp_dir) in benchmarks.
+    global _storage
+    with _storage_lock:
+        _storage = storage
@@ -0,0 +1,393 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from storage import read_journal, write_journal
+from synthetic import synthetic_fills, export_frame, journal_frame, write_export, write_exports
+from filters import apply_date_filter, period_start
+from metrics import calculate_overall_stats, calculate_filtered_stats
+from stats_engine import StatsEngine
+from daily_series import build_daily_series, daily_window, save_daily_series
+from downsample import CHART_POINT_BUDGET, downsample_daily
+from visuals import plot_equity, plot_drawdown
+from history import TradeView, render_rows
+from instruments import instrument_breakdown
+from lots import match_lots
+from risk import simulate
+from rolling import rolling_metrics, trade_arrays
+from rollups import build_rollup_cube, period_over_period, save_rollup_cube
+from snapshot import load_snapshot
+from sql_store import JournalStore, SqlTradeView, store_path
+from trade_index import TradeIndex
+from backends import LocalStorage, set_storage
+
+# Times every stage of the dashboard on synthetic journals and compares the
+# results with a stored baseline, e.g.
+#   python benchmark.py --rows 1k 100k 1M              # compare with the baseline
+#   python benchmark.py --rows 1k 100k 1M --save-baseline
+# Generated journals and exports are kept under BENCH_DIR and reused.
+BENCH_DIR = ".benchmarks"
+BASELINE_FILE = "benchmark_baseline.json"
+DEFAULT_ROWS = ["1k", "10k", "100k"]
+# Fills in the export of the incremental ingest; half of them are already in
+# the journal, the rest are new trades.
+DELTA_FILLS = 2000
+TOLERANCE = 0.25
+# Slowdowns smaller than this are timer noise, whatever the ratio.
+NOISE_SECONDS = 0.01
+PERIODS = ["Last Day", "Last week", "Last month", "All Time"]
+
+
+def parse_rows(value):
+    # "1k" -> 1000, "10M" -> 10000000
+    value = value.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(value[-1])
+    return int(float(value[:-1]) * scale) if scale else int(value)
+
+
+def prepare_data(rows, seed, with_exports):
+    # Journal of `rows` trades plus the exports that produce it; generated
+    # once per (rows, seed) and cached on disk.
+    folder = os.path.abspath(os.path.join(BENCH_DIR, f"{rows}-{seed}"))
+    journal_path = os.path.join(folder, "journal.parquet")
+    exports_dir = os.path.join(folder, "exports")
+    delta_path = os.path.join(folder, "delta.xlsx")
+    ready = os.path.exists(journal_path) and (not with_exports or os.path.exists(delta_path))
+    if not ready:
+        print(f"Generating {rows} trades (seed {seed})...")
+        os.makedirs(folder, exist_ok=True)
+        fills = synthetic_fills(2 * rows + DELTA_FILLS, seed)
+        history = fills.iloc[:2 * rows]
+        write_journal(journal_frame(history, seed=seed), journal_path)
+        if with_exports:
+            shutil.rmtree(exports_dir, ignore_errors=True)
+            write_exports(export_frame(history), exports_dir)
+            write_export(export_frame(fills.iloc[2 * rows - DELTA_FILLS // 2:]), delta_path)
+    exports = sorted(os.path.join(exports_dir, name) for name in os.listdir(exports_dir)) \
+        if os.path.isdir(exports_dir) else []
+    return {"rows": rows, "seed": seed, "journal_source": journal_path, "exports": exports, "delta_export": delta_path}
+
+
+# Each stage does its untimed setup and returns the callable that is timed.
+
+def _wait_for_uploads(ctx):
+    queue = ctx["tradingjournal"].get_upload_queue()
+    while queue.pending():
+        time.sleep(0.05)
+    return queue
+
+
+def _reset_workdir(ctx):
+    # Empty journal, bucket, cache and outbox for an ingest run.
+    queue = _wait_for_uploads(ctx)
+    for name in os.listdir("."):
+        shutil.rmtree(name) if os.path.isdir(name) else os.remove(name)
+    os.makedirs(queue.objects_dir, exist_ok=True)
+
+
+def stage_ingest(ctx):
+    _reset_workdir(ctx)
+    update = ctx["tradingjournal"].update_trading_journal
+    exports = ctx["exports"]
+    return lambda: [update(path, "journal.parquet") for path in exports]
+
+
+def stage_ingest_delta(ctx):
+    _reset_workdir(ctx)
+    token = write_journal(ctx["journal"], "journal.parquet")
+    TradeIndex.build(ctx["journal"]).save("journal.parquet", token)
+    save_daily_series("journal.parquet", build_daily_series(ctx["journal"]), token)
+    save_rollup_cube("journal.parquet", build_rollup_cube(ctx["journal"]), token)
+    # The base is published first, as the first ingest would have done.
+    ctx["tradingjournal"].enqueue_journal_upload("journal.parquet", ["journal.parquet"])
+    _wait_for_uploads(ctx)
+    update = ctx["tradingjournal"].update_trading_journal
+    return lambda: update(ctx["delta_export"], "journal.parquet")
+
+
+def stage_load(ctx):
+    return lambda: read_journal(ctx["journal_source"])
+
+
+def stage_snapshot(ctx):
+    # The shared dashboard copy: read once per journal version, not per session.
+    return lambda: load_snapshot(ctx["journal_source"], None)
+
+
+def stage_date_filter(ctx):
+    df = ctx["df"]
+    return lambda: [apply_date_filter(df.copy(), period) for period in PERIODS]
+
+
+def stage_stats(ctx):
+    df = ctx["df"]
+    today = df["Date"].max().normalize()
+
+    def run():
+        calculate_overall_stats(df)
+        for period in PERIODS:
+            start = period_start(period, today)
+            calculate_filtered_stats(df if start is None else df[df["Date"] >= start], df)
+    return run
+
+
+def stage_stats_engine(ctx):
+    df = ctx["df"]
+
+    def run():
+        engine = StatsEngine(df)
+        engine.overall_stats()
+        for period in PERIODS:
+            engine.period_stats(period)
+    return run
+
+
+def stage_daily_series(ctx):
+    return lambda: build_daily_series(ctx["df"])
+
+
+def stage_charts(ctx):
+    daily = build_daily_series(ctx["df"])
+
+    def run():
+        for period in PERIODS:
+            window = daily_window(daily, period)
+            points = downsample_daily(window, CHART_POINT_BUDGET, "Cumulative PnL")
+            plot_equity(points, webgl=len(points) < len(window))
+            points = downsample_daily(window, CHART_POINT_BUDGET, "Drawdown")
+            plot_drawdown(points, webgl=len(points) < len(window))
+    return run
+
+
+def stage_rollups(ctx):
+    def run():
+        cube = build_rollup_cube(ctx["df"])
+        for level in ("week", "month", "year"):
+            period_over_period(cube, level)
+    return run
+
+
+def stage_instruments(ctx):
+    daily = build_daily_series(ctx["df"])
+    return lambda: instrument_breakdown(ctx["df"], daily)
+
+
+def stage_rolling(ctx):
+    dates, pnl = trade_arrays(ctx["df"])
+    return lambda: [rolling_metrics(dates, pnl, 100, "Trades"), rolling_metrics(dates, pnl, 30, "Days")]
+
+
+def stage_lots(ctx):
+    # FIFO matching over the raw fills behind the journal (two per trade).
+    fills = synthetic_fills(2 * ctx["rows"], ctx["seed"])
+    return lambda: match_lots(fills)
+
+
+def stage_risk(ctx):
+    pnl = ctx["df"]["Total Position PnL"].to_numpy()
+    return lambda: simulate(pnl, 10_000, 250)
+
+
+def stage_history(ctx):
+    # The work behind render_trade_history: the sorted view, a filter and
+    # the HTML of one page.
+    df = ctx["df"]
+
+    def run():
+        view = TradeView(df)
+        render_rows(view.page(view.select(), 1, 25))
+        positions = view.select(names=[view.names[0]], pnl_sign="Wins")
+        render_rows(view.page(positions, 1, 500))
+    return run
+
+
+def stage_sql_store(ctx):
+    # Building the SQLite copy, then the dashboard's queries against it.
+    path = store_path(ctx["journal_source"])
+    if os.path.exists(path):
+        os.remove(path)
+
+    def run():
+        store = JournalStore.open(ctx["journal_source"])
+        store.overall_stats()
+        for period in PERIODS:
+            store.period_stats(period)
+        store.daily_rollup()
+        view = SqlTradeView(store)
+        render_rows(view.page(view.select(), 1, 25))
+        render_rows(view.page(view.select(names=[view.names[0]], pnl_sign="Wins"), 1, 500))
+    return run
+
+
+STAGES = {
+    "ingest": stage_ingest,
+    "ingest_delta": stage_ingest_delta,
+    "load": stage_load,
+    "snapshot": stage_snapshot,
+    "date_filter": stage_date_filter,
+    "stats": stage_stats,
+    "stats_engine": stage_stats_engine,
+    "daily_series": stage_daily_series,
+    "charts": stage_charts,
+    "rollups": stage_rollups,
+    "instruments": stage_instruments,
+    "rolling": stage_rolling,
+    "lots": stage_lots,
+    "risk": stage_risk,
+    "history": stage_history,
+    "sql_store": stage_sql_store,
+}
+INGEST_STAGES = {"ingest", "ingest_delta"}
+
+
+def measure(stage, ctx, repeat, memory):
+    # Best wall time over `repeat` runs, then the peak of Python and NumPy
+    # allocations in one traced run (Arrow buffers are not traced).
+    seconds = []
+    for _ in range(repeat):
+        run = stage(ctx)
+        gc.collect()
+        started = time.perf_counter()
+        run()
+        seconds.append(time.perf_counter() - started)
+
+    result = {"seconds": min(seconds)}
+    if memory:
+        run = stage(ctx)
+        gc.collect()
+        tracemalloc.start()
+        run()
+        result["peak_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return result
+
+
+def run_benchmarks(sizes, stages, seed=0, repeat=3, memory=True):
+    results = {}
+    with_exports = bool(INGEST_STAGES & set(stages))
+    contexts = {rows: prepare_data(rows, seed, with_exports) for rows in sizes}
+
+    # Ingest runs in a scratch directory synced to a local bucket.
+    home = os.getcwd()
+    workdir = os.path.abspath(os.path.join(BENCH_DIR, "work"))
+    shutil.rmtree(workdir, ignore_errors=True)
+    os.makedirs(workdir)
+    os.chdir(workdir)
+    try:
+        module = _import_tradingjournal(os.path.join(workdir, ".bucket")) if with_exports else None
+        for rows, ctx in contexts.items():
+            ctx["tradingjournal"] = module
+            ctx["journal"] = read_journal(ctx["journal_source"])
+            ctx["df"] = ctx["journal"].dropna(subset=["Date", "Total Position PnL"])
+            results[str(rows)] = {}
+            for name in stages:
+                results[str(rows)][name] = measure(STAGES[name], ctx, repeat, memory)
+                print(f"  {rows:>10} {name:<14} {_format(results[str(rows)][name])}")
+        if with_exports:
+            _wait_for_uploads(ctx)
+    finally:
+        os.chdir(home)
+    return results
+
+
+def _import_tradingjournal(bucket_root):
+    # Ingest syncs with a local bucket instead of Supabase.
+    set_storage(LocalStorage(bucket_root))
+    import tradingjournal
+    return tradingjournal
+
+
+def _format(result):
+    text = f"{result['seconds'] * 1000:10.1f} ms"
+    if "peak_mb" in result:
+        text += f" {result['peak_mb']:9.1f} MB"
+    return text
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "pyarrow": pa.__version__,
+    }
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    # Prints every stage next to its baseline; returns the regressions.
+    regressions = []
+    for rows, stages in results.items():
+        for name, result in stages.items():
+            base = baseline.get("results", {}).get(rows, {}).get(name)
+            if base is None:
+                print(f"  {rows:>10} {name:<14} {_format(result)}   (no baseline)")
+                continue
+            change = result["seconds"] / base["seconds"] - 1 if base["seconds"] else 0.0
+            flags = []
+            if change > tolerance and result["seconds"] - base["seconds"] > NOISE_SECONDS:
+                flags.append(f"time +{change:.0%}")
+            if "peak_mb" in result and "peak_mb" in base and base["peak_mb"] \
+                    and result["peak_mb"] / base["peak_mb"] - 1 > tolerance:
+                flags.append(f"memory +{result['peak_mb'] / base['peak_mb'] - 1:.0%}")
+            status = "⚠️ " + ", ".join(flags) if flags else "✅"
+            print(f"  {rows:>10} {name:<14} {_format(result)}   {change:+7.1%}  {status}")
+            if flags:
+                regressions.append((rows, name, flags))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the journal pipeline on synthetic data.")
+    parser.add_argument("--rows", nargs="+", default=DEFAULT_ROWS, help="journal sizes, e.g. 1k 100k 10M")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=list(STAGES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage, the best is kept")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced peak-memory run")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    sizes = [parse_rows(value) for value in args.rows]
+    results = run_benchmarks(sizes, args.stages, args.seed, args.repeat, not args.no_memory)
+    report = {"environment": environment(), "seed": args.seed, "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Baseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"⚠️ No baseline at {args.baseline}; run with --save-baseline first")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("environment") != report["environment"]:
+        print("⚠️ Baseline was recorded in a different environment:", baseline.get("environment"))
+    print(f"Compared with {args.baseline} (tolerance {args.tolerance:.0%}):")
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"⚠️ {len(regressions)} stage(s) regressed")
+        return 1
+    print("✅ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from filters import period_start
+
+# One row per trading day: the series both the equity and the drawdown
+# charts are drawn from. It is built once per journal write and extended
+# in place when an ingest only appends newer trades.
+DAILY_COLUMNS = ["Date", "Total Position PnL", "Cumulative PnL", "Running Peak", "Drawdown"]
+
+
+def daily_series_path(journal_path):
+    return f"{journal_path}.daily.parquet"
+
+
+def _daily_pnl(df):
+    df = df[df["Total Position PnL"].notna()]
+    dates = pd.to_datetime(df["Date"], errors="coerce").dt.normalize()
+    return df["Total Position PnL"].groupby(dates).sum()
+
+
+def _with_running_totals(dates, pnl, cum_start=0.0, peak_start=-np.inf):
+    cumulative = cum_start + np.cumsum(pnl)
+    peak = np.maximum(np.maximum.accumulate(cumulative), peak_start) if len(cumulative) else cumulative
+    return pd.DataFrame({
+        "Date": pd.DatetimeIndex(dates).astype("datetime64[ns]"),
+        "Total Position PnL": pnl,
+        "Cumulative PnL": cumulative,
+        "Running Peak": peak,
+        "Drawdown": cumulative - peak,
+    })
+
+
+def build_daily_series(df):
+    daily = _daily_pnl(df)
+    return _with_running_totals(daily.index, daily.to_numpy(dtype=float))
+
+
+def append_daily_series(daily, new_trades):
+    # Extend the series with trades appended to the journal. Returns None when
+    # the new trades land before the last day and a rebuild is needed.
+    new_daily = _daily_pnl(new_trades)
+    if new_daily.empty:
+        return daily
+    if daily.empty:
+        return _with_running_totals(new_daily.index, new_daily.to_numpy(dtype=float))
+
+    last_day = daily["Date"].iloc[-1]
+    if new_daily.index[0] < last_day:
+        return None
+
+    # Trades on the current last day are folded into that day's row.
+    if new_daily.index[0] == last_day:
+        new_daily.iloc[0] += daily["Total Position PnL"].iloc[-1]
+        daily = daily.iloc[:-1]
+
+    cum_start = daily["Cumulative PnL"].iloc[-1] if len(daily) else 0.0
+    peak_start = daily["Running Peak"].iloc[-1] if len(daily) else -np.inf
+    tail = _with_running_totals(new_daily.index, new_daily.to_numpy(dtype=float), cum_start, peak_start)
+    return pd.concat([daily, tail], ignore_index=True)
+
+
+def slice_daily_series(daily, start=None):
+    # Cumulative PnL restarts at zero on the first day of the window, so the
+    # window is rebased on the day before it rather than re-aggregated.
+    first = int(np.searchsorted(daily["Date"].to_numpy(), np.datetime64(start, "ns"))) if start is not None else 0
+    if first == 0:
+        return daily
+    window = daily.iloc[first:]
+    cumulative = window["Cumulative PnL"].to_numpy() - daily["Cumulative PnL"].iloc[first - 1]
+    peak = np.maximum.accumulate(cumulative) if len(cumulative) else cumulative
+    return pd.DataFrame({
+        "Date": window["Date"].to_numpy(),
+        "Total Position PnL": window["Total Position PnL"].to_numpy(),
+        "Cumulative PnL": cumulative,
+        "Running Peak": peak,
+        "Drawdown": cumulative - peak,
+    })
+
+
+def daily_window(daily, period):
+    if daily.empty:
+        return daily
+    return slice_daily_series(daily, period_start(period, daily["Date"].iloc[-1]))
+
+
+def read_daily_series(journal_path, token):
+    # Returns None when the stored series is missing or from another journal write.
+    path = daily_series_path(journal_path)
+    if token is None or not os.path.exists(path):
+        return None
+    table = pq.read_table(path)
+    metadata = table.schema.metadata or {}
+    if metadata.get(b"journal_token", b"").decode() != token:
+        return None
+    return table.to_pandas()
+
+
+def save_daily_series(journal_path, daily, token):
+    table = pa.Table.from_pandas(daily[DAILY_COLUMNS], preserve_index=False)
+    table = table.replace_schema_metadata({"journal_token": token})
+    path = daily_series_path(journal_path)
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_daily_series(journal_path, df, token):
+    # Stored series for this journal write, or built from df and stored.
+    daily = read_daily_series(journal_path, token)
+    if daily is None:
+        daily = build_daily_series(df)
+        if token is not None:
+            save_daily_series(journal_path, daily, token)
+    return daily
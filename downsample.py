@@ -0,0 +1,69 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Above this many points the charts are downsampled and drawn with WebGL.
+CHART_POINT_BUDGET = int(os.environ.get("CHART_POINT_BUDGET", 2000))
+
+
+def lttb_indices(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: keeps the first and last point and, per
+    # bucket, the point forming the largest triangle with its neighbours.
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    bucket = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    selected = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket) + 1
+        end = int((i + 1) * bucket) + 1
+        next_end = min(int((i + 2) * bucket) + 1, n)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        area = np.abs(
+            (x[selected] - avg_x) * (y[start:end] - y[selected])
+            - (x[selected] - x[start:end]) * (avg_y - y[selected])
+        )
+        selected = start + int(np.argmax(area))
+        indices[i + 1] = selected
+    return indices
+
+
+def extreme_indices(daily, limit):
+    # The highest equity point, the deepest trough and, for the `limit`
+    # deepest drawdown episodes, the peak that opened them and their trough.
+    cumulative = daily["Cumulative PnL"].to_numpy()
+    drawdown = pd.Series(daily["Drawdown"].to_numpy())
+    keep = {0, len(daily) - 1, int(np.argmax(cumulative)), int(drawdown.idxmin())}
+
+    episode = np.cumsum(drawdown.to_numpy() == 0)
+    grouped = drawdown.groupby(episode)
+    depth = grouped.min()
+    deepest = depth[depth < 0].nsmallest(limit).index.to_numpy()
+    keep.update(grouped.idxmin()[deepest].astype(int).tolist())
+    keep.update(np.searchsorted(episode, deepest, "left").tolist())
+    return np.array(sorted(keep), dtype=np.int64)
+
+
+def downsample_daily(daily, budget=CHART_POINT_BUDGET, column="Cumulative PnL"):
+    # At most `budget` rows of the daily series, shaped by `column`.
+    if len(daily) <= budget:
+        return daily
+    keep = extreme_indices(daily, max(1, budget // 10))
+    x = daily["Date"].to_numpy(dtype="datetime64[ns]").view(np.int64).astype(float)
+    y = daily[column].to_numpy(dtype=float)
+    chosen = lttb_indices(x, y, max(3, budget - len(keep)))
+    return daily.iloc[np.union1d(chosen, keep)]
+
+
+def downsample_series(frame, budget, column):
+    # At most `budget` rows of any dated series (e.g. rolling metrics),
+    # shaped by `column` alone.
+    if len(frame) <= budget:
+        return frame
+    x = frame["Date"].to_numpy(dtype="datetime64[ns]").view(np.int64).astype(float)
+    return frame.iloc[lttb_indices(x, frame[column].to_numpy(dtype=float), budget)]
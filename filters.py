@@ -1,15 +1,26 @@
 from datetime import timedelta
 import pandas as pd
 
-def apply_date_filter(df, period):
-    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
-    today = df["Date"].max().normalize()
 
+def period_start(period, today):
+    # First day included in a filter chip's window ending on `today`.
     if period == "Last Day":
-        return df[df["Date"].dt.date == today.date()]
+        return today
     elif period == "Last week":
-        return df[df["Date"] >= today - timedelta(days=6)]
+        return today - timedelta(days=6)
     elif period == "Last month":
-        return df[df["Date"] >= today - timedelta(days=29)]
+        return today - timedelta(days=29)
     else:
+        return None
+
+
+def apply_date_filter(df, period):
+    # Leaves the caller's frame alone and only parses dates that are not
+    # already datetimes.
+    dates = df["Date"]
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, errors="coerce")
+    start = period_start(period, dates.max().normalize())
+    if start is None:
         return df
+    return df[dates >= start]
@@ -1,18 +1,15 @@
+import html
+import numpy as np
 import streamlit as st
 import pandas as pd
+from annotations import apply_annotations, trade_ids
+from memo import render_cache
+from profiling import span
 
-def render_trade_history(df):
-    completed_trades = df[df["Total Position PnL"].notna()].sort_values("Date", ascending=False).copy()
+PAGE_SIZES = [10, 25, 50, 100, 500]
+ROW_HEIGHT = 42
 
-    page_size = 10
-    total_pages = max(1, (len(completed_trades) - 1) // page_size + 1)
-    page = st.number_input("Page", min_value=1, max_value=total_pages, step=1)
-
-    start = (page - 1) * page_size
-    end = start + page_size
-    paginated_trades = completed_trades.iloc[start:end]
-
-    table_html = """
+TABLE_STYLE = """
     <style>
     .custom-table {
         width: 100%;
@@ -29,6 +26,8 @@ def render_trade_history(df):
         background-color: #222;
         color: #f0f0f0;
         text-align: left;
+        position: sticky;
+        top: 0;
     }
     .custom-table tr:nth-child(even) {
         background-color: #2a2a2a;
@@ -61,20 +60,152 @@ def render_trade_history(df):
     <tbody>
     """
 
-    for _, row in paginated_trades.iterrows():
-        note = row["Notes"] if pd.notna(row["Notes"]) and str(row["Notes"]).strip().lower() != "nan" else "—"
-        pnl_color = "limegreen" if row["Total Position PnL"] > 0 else "tomato"
-        table_html += f"""
-        <tr>
-            <td>{row['Date'].strftime('%Y-%m-%d')}</td>
-            <td>{row['Name']}</td>
-            <td>{row['Action']}</td>
-            <td>{row['Quantity']}</td>
-            <td>{row['Price']}</td>
-            <td style="color:{pnl_color}">{row['Total Position PnL']:.2f}</td>
-            <td class="notes">{note}</td>
-        </tr>
-        """
-
-    table_html += "</tbody></table>"
-    st.components.v1.html(table_html, height=500, scrolling=True)
\ No newline at end of file
+
+class TradeView:
+    """Completed trades sorted newest first, with arrays for fast filtering.
+
+    Built once per journal write; filters return row positions and only the
+    requested page is ever turned into HTML.
+    """
+
+    def __init__(self, df):
+        trades = df[df["Total Position PnL"].notna()]
+        self.trades = trades.sort_values("Date", ascending=False, kind="stable").reset_index(drop=True)
+        # Negated timestamps are ascending, so date ranges are binary searches.
+        self.neg_dates = -self.trades["Date"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+        self.name_codes, self.names = pd.factorize(self.trades["Name"], sort=True)
+        self.action_codes, self.actions = pd.factorize(self.trades["Action"], sort=True)
+        self.pnl = self.trades["Total Position PnL"].to_numpy(dtype=float)
+
+    def __len__(self):
+        return len(self.trades)
+
+    def pnl_range(self):
+        return (float(self.pnl.min()), float(self.pnl.max())) if len(self.pnl) else (None, None)
+
+    def select(self, names=None, action=None, start=None, end=None, pnl_sign=None, pnl_min=None, pnl_max=None):
+        # Positions of matching trades, newest first.
+        first, last = 0, len(self.trades)
+        if end is not None:
+            first = int(np.searchsorted(self.neg_dates, -pd.Timestamp(end).value, "left"))
+        if start is not None:
+            last = int(np.searchsorted(self.neg_dates, -pd.Timestamp(start).value, "right"))
+        positions = np.arange(first, max(first, last))
+
+        mask = None
+        if names:
+            codes = [self.names.get_loc(name) for name in names if name in self.names]
+            mask = np.isin(self.name_codes[positions], codes)
+        if action:
+            matches = self.action_codes[positions] == (self.actions.get_loc(action) if action in self.actions else -2)
+            mask = matches if mask is None else mask & matches
+        if pnl_sign == "Wins":
+            matches = self.pnl[positions] > 0
+            mask = matches if mask is None else mask & matches
+        elif pnl_sign == "Losses":
+            matches = self.pnl[positions] < 0
+            mask = matches if mask is None else mask & matches
+        if pnl_min is not None:
+            matches = self.pnl[positions] >= pnl_min
+            mask = matches if mask is None else mask & matches
+        if pnl_max is not None:
+            matches = self.pnl[positions] <= pnl_max
+            mask = matches if mask is None else mask & matches
+        return positions if mask is None else positions[mask]
+
+    def page(self, positions, page, page_size):
+        start = (page - 1) * page_size
+        return self.trades.iloc[positions[start:start + page_size]]
+
+
+def render_rows(trades):
+    # Builds every row of the page with vectorized string operations.
+    if trades.empty:
+        return ""
+    notes = trades["Notes"].astype(object)
+    notes = notes.where(notes.notna() & (notes.astype(str).str.strip().str.lower() != "nan"), "—")
+    pnl = trades["Total Position PnL"]
+    pnl_color = pd.Series(np.where(pnl > 0, "limegreen", "tomato"), index=trades.index)
+
+    rows = (
+        "<tr><td>" + trades["Date"].dt.strftime("%Y-%m-%d")
+        + "</td><td>" + trades["Name"].astype(str).map(html.escape)
+        + "</td><td>" + trades["Action"].astype(str).map(html.escape)
+        + "</td><td>" + trades["Quantity"].astype(str).map(html.escape)
+        + "</td><td>" + trades["Price"].astype(str)
+        + '</td><td style="color:' + pnl_color + '">' + pnl.map("{:.2f}".format)
+        + '</td><td class="notes">' + notes.astype(str).map(html.escape)
+        + "</td></tr>"
+    )
+    return "\n".join(rows.tolist())
+
+
+def render_trade_history(view, version=None, annotations=None, notes_version=None, save_note=None):
+    filter_cols = st.columns([3, 1, 1, 2, 2])
+    names = filter_cols[0].multiselect("Name", list(view.names), key="history_names")
+    action = filter_cols[1].selectbox("Action", ["All"] + list(view.actions), key="history_action")
+    pnl_sign = filter_cols[2].selectbox("PnL", ["All", "Wins", "Losses"], key="history_pnl")
+    date_range = filter_cols[3].date_input("Date range", value=(), key="history_dates")
+    start, end = (date_range + (None, None))[:2] if isinstance(date_range, tuple) else (date_range, None)
+    low, high = view.pnl_range()
+    pnl_min, pnl_max = None, None
+    if low is not None and low < high:
+        pnl_min, pnl_max = filter_cols[4].slider("PnL range", low, high, (low, high), key="history_pnl_range")
+        # The full range means no filter, which also covers later uploads.
+        pnl_min = None if pnl_min <= low else pnl_min
+        pnl_max = None if pnl_max >= high else pnl_max
+
+    filter_key = (tuple(names), action, start, end, pnl_sign, pnl_min, pnl_max)
+    with span("history filter") as s:
+        positions = render_cache.get(version, ("history_rows",) + filter_key, lambda: view.select(
+            names=names,
+            action=None if action == "All" else action,
+            start=start,
+            end=end,
+            pnl_sign=None if pnl_sign == "All" else pnl_sign,
+            pnl_min=pnl_min,
+            pnl_max=pnl_max,
+        ))
+        s.set(rows=len(positions))
+
+    page_cols = st.columns([1, 1, 3])
+    page_size = page_cols[0].selectbox("Rows per page", PAGE_SIZES, key="history_page_size")
+    total_pages = max(1, (len(positions) - 1) // page_size + 1)
+    page = page_cols[1].number_input("Page", min_value=1, max_value=total_pages, step=1)
+    page_cols[2].caption(f"{len(positions)} of {len(view)} trades · page {page} of {total_pages}")
+
+    def page_trades():
+        trades = view.page(positions, page, page_size)
+        return trades if annotations is None else apply_annotations(trades, annotations)
+
+    # Edited notes change the page, not the journal version.
+    page_key = ("history_page",) + filter_key + (page_size, page, notes_version)
+    with span("history html") as s:
+        rows_html, row_count = render_cache.get(version, page_key, lambda: (
+            render_rows(page_trades()),
+            len(positions[(page - 1) * page_size:page * page_size]),
+        ))
+        s.set(rows=row_count, bytes=len(rows_html))
+    table_html = TABLE_STYLE + rows_html + "</tbody></table>"
+    height = min(800, 80 + ROW_HEIGHT * max(1, row_count))
+    st.components.v1.html(table_html, height=height, scrolling=True)
+
+    if save_note is not None and row_count:
+        render_note_editor(page_trades(), save_note)
+
+
+def render_note_editor(trades, save_note):
+    # Edit Notes/Ratio of a trade on the current page.
+    with st.expander("✏️ Edit notes"):
+        labels = (trades["Date"].dt.strftime("%Y-%m-%d") + " · " + trades["Name"].astype(str) + " · "
+                  + trades["Action"].astype(str) + " · " + trades["Total Position PnL"].map("{:.2f}".format)).tolist()
+        choice = st.selectbox("Trade", range(len(labels)), format_func=labels.__getitem__, key="note_trade")
+        trade = trades.iloc[[choice]]
+        with st.form("note_form"):
+            notes = trade["Notes"].iloc[0]
+            ratio = trade["Ratio"].iloc[0]
+            notes = st.text_area("Notes", "" if pd.isna(notes) else notes)
+            ratio = st.text_input("Ratio", "" if pd.isna(ratio) else ratio)
+            if st.form_submit_button("Save"):
+                save_note(trade_ids(trade)[0], notes.strip(), ratio.strip())
+                st.rerun()
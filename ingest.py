@@ -0,0 +1,111 @@
+import os
+import pandas as pd
+from profiling import span
+from storage import empty_journal, normalize_journal
+from trade_index import TRADE_KEY, trade_key_hashes
+
+# Broker exports are read in row blocks so memory stays flat however long
+# the export is; only rows with a realised PnL survive each block.
+CHUNK_ROWS = 5000
+CURRENCY_COLUMNS = ["Price", "Value", "Total Position PnL"]
+# Example input: "04.03.2023 10:30 AM UTC"
+EXPORT_DATE_FORMAT = "%d.%m.%Y %I:%M %p %Z"
+
+
+def iter_export_chunks(path, chunk_rows=CHUNK_ROWS):
+    # openpyxl is only loaded when an export is actually read.
+    import openpyxl
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(col) if col is not None else f"Unnamed: {i}" for i, col in enumerate(header)]
+
+        block = []
+        for row in rows:
+            block.append(row)
+            if len(block) == chunk_rows:
+                yield pd.DataFrame(block, columns=columns)
+                block = []
+        if block:
+            yield pd.DataFrame(block, columns=columns)
+    finally:
+        workbook.close()
+
+
+def parse_currency(values):
+    # One regex pass strips the ₮/$ signs, thousands separators and spaces.
+    return (
+        values.astype(str)
+        .str.replace(r"[₮$,\s]", "", regex=True)
+        .replace("", "0")
+        .astype(float)
+    )
+
+
+def parse_export_dates(values):
+    return pd.to_datetime(
+        values,
+        format=EXPORT_DATE_FORMAT,  # includes the "UTC" part
+        errors="coerce",
+        dayfirst=True
+    ).dt.tz_localize(None).dt.normalize()
+
+
+def clean_export_chunk(chunk):
+    pnl = chunk["Total Position PnL"]
+    chunk = chunk[pnl.notna() & (pnl.astype(str).str.strip() != "")].copy()
+    for col in CURRENCY_COLUMNS:
+        chunk[col] = parse_currency(chunk[col])
+    chunk["Date"] = parse_export_dates(chunk["Date"])
+    return chunk
+
+
+def iter_clean_trades(path, chunk_rows=CHUNK_ROWS):
+    chunks = iter_export_chunks(path, chunk_rows)
+    while True:
+        # Timed per block, so the span excludes the caller's merge work.
+        with span("excel parse") as s:
+            chunk = next(chunks, None)
+            if chunk is None:
+                return
+            s.set(rows=len(chunk))
+            chunk = clean_export_chunk(chunk)
+        if len(chunk):
+            yield chunk
+
+
+def parse_export(path):
+    # One export cleaned into journal rows; runs in a worker process.
+    chunks = list(iter_clean_trades(path))
+    return normalize_journal(pd.concat(chunks)) if chunks else empty_journal()
+
+
+def clean_exports(paths, workers=None):
+    """Parse many exports in parallel and reduce them to one batch of trades.
+
+    Later paths win for a trade key, but a Notes or Ratio value from an
+    earlier file is kept when the later one has none.
+    """
+    if len(paths) > 1 and workers != 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers or min(len(paths), os.cpu_count() or 1)) as pool:
+            frames = list(pool.map(parse_export, paths))
+    else:
+        frames = [parse_export(path) for path in paths]
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        return empty_journal()
+
+    with span("reduce") as s:
+        batch = pd.concat(frames, ignore_index=True)
+        keys = trade_key_hashes(batch)
+        annotations = batch[["Notes", "Ratio"]].groupby(keys).last()
+        batch = batch.set_axis(keys).drop_duplicates(subset=TRADE_KEY, keep="last")
+        batch["Notes"] = batch["Notes"].combine_first(annotations["Notes"])
+        batch["Ratio"] = batch["Ratio"].combine_first(annotations["Ratio"])
+        batch = batch.sort_values("Date", kind="stable").reset_index(drop=True)
+        s.set(rows=len(batch), files=len(paths))
+    return batch
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+# Per-instrument breakdown of the completed trades. Raw aggregates come from
+# one grouped pass (bincount over factorized names, or SQL GROUP BY in
+# sql_store) and are finished into the table shown in the dashboard.
+RAW_COLUMNS = ["Name", "trades", "wins", "losses", "total", "win_sum", "loss_sum", "max_win", "max_loss", "dd_pnl"]
+# Enough rows for the table to stay interactive with thousands of symbols.
+TABLE_HEIGHT = 420
+
+
+def max_drawdown_window(daily):
+    # (peak day, trough day, depth) of the deepest drawdown in the daily
+    # series, None when equity never fell below a previous peak.
+    if daily.empty:
+        return None
+    drawdown = daily["Drawdown"].to_numpy()
+    trough = int(np.argmin(drawdown))
+    if drawdown[trough] >= 0:
+        return None
+    cumulative = daily["Cumulative PnL"].to_numpy()
+    peak = int(np.argmax(cumulative[:trough + 1])) if trough else 0
+    return daily["Date"].iloc[peak], daily["Date"].iloc[trough], float(drawdown[trough])
+
+
+def raw_breakdown(df, window=None):
+    # All aggregates per Name in one pass over the trades.
+    df = df[df["Total Position PnL"].notna()]
+    # Trades without a name are grouped under "", as in the SQL store.
+    codes, names = pd.factorize(df["Name"].astype(object).fillna(""), sort=True)
+    pnl = df["Total Position PnL"].to_numpy(dtype=float)
+    size = len(names)
+
+    def per_name(values):
+        return np.bincount(codes, weights=values, minlength=size)
+
+    order = np.argsort(codes, kind="stable")
+    starts = np.searchsorted(codes[order], np.arange(size))
+    sorted_pnl = pnl[order]
+    raw = pd.DataFrame({
+        "Name": names,
+        "trades": np.bincount(codes, minlength=size),
+        "wins": per_name(pnl > 0).astype(int),
+        "losses": per_name(pnl < 0).astype(int),
+        "total": per_name(pnl),
+        "win_sum": per_name(np.where(pnl > 0, pnl, 0.0)),
+        "loss_sum": per_name(np.where(pnl < 0, pnl, 0.0)),
+        "max_win": np.maximum.reduceat(sorted_pnl, starts) if size else [],
+        "max_loss": np.minimum.reduceat(sorted_pnl, starts) if size else [],
+        "dd_pnl": 0.0,
+    })
+    if window is not None:
+        # Trades from the day after the peak through the trough day.
+        days = df["Date"].to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+        in_drawdown = (days > np.datetime64(window[0], "D")) & (days <= np.datetime64(window[1], "D"))
+        raw["dd_pnl"] = per_name(np.where(in_drawdown, pnl, 0.0))
+    return raw
+
+
+def breakdown_table(raw, window=None):
+    # The dashboard table from raw aggregates, biggest earners first.
+    trades = raw["trades"].to_numpy(dtype=float)
+    wins = raw["wins"].to_numpy(dtype=float)
+    losses = raw["losses"].to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        win_rate = np.where(trades > 0, wins / trades * 100, 0.0)
+        avg_win = np.where(wins > 0, raw["win_sum"] / wins, 0.0)
+        avg_loss = np.where(losses > 0, raw["loss_sum"] / losses, 0.0)
+    table = pd.DataFrame({
+        "Name": raw["Name"],
+        "Trades": raw["trades"].astype(int),
+        "Wins": raw["wins"].astype(int),
+        "Losses": raw["losses"].astype(int),
+        "Win Rate %": win_rate,
+        "Avg Win": avg_win,
+        "Avg Loss": avg_loss,
+        "Expectancy": win_rate / 100 * avg_win + (1 - win_rate / 100) * avg_loss,
+        "Total PnL": raw["total"].astype(float),
+        "Max Win": raw["max_win"].astype(float),
+        "Max Loss": raw["max_loss"].astype(float),
+        # PnL booked between the peak and the trough of the deepest
+        # drawdown; the column sums to the drawdown itself.
+        "Drawdown PnL": raw["dd_pnl"].astype(float),
+    })
+    depth = window[2] if window is not None else 0.0
+    table["Drawdown Share %"] = table["Drawdown PnL"] / depth * 100 if depth else 0.0
+    return table.sort_values("Total PnL", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def instrument_breakdown(df, daily):
+    window = max_drawdown_window(daily)
+    return breakdown_table(raw_breakdown(df, window), window)
@@ -1,9 +1,12 @@
 import streamlit as st
 import pandas as pd
+from annotations import apply_annotations
 
 
-def render_latest_trades(df):
+def render_latest_trades(df, annotations=None):
     recent_trades = df.sort_values("Date", ascending=False).head(5)
+    if annotations is not None:
+        recent_trades = apply_annotations(recent_trades, annotations)
     for _, row in recent_trades.iterrows():
         st.markdown(f"""
         <div style='border:1px solid #444; border-radius:10px; padding:10px; margin-bottom:6px; background-color:#1e1e1e;'>
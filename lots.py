@@ -0,0 +1,210 @@
+import numpy as np
+import pandas as pd
+from ingest import EXPORT_DATE_FORMAT, iter_export_chunks, parse_currency
+from profiling import timed
+
+# Lot matching over the raw fills of broker exports. The journal keeps only
+# the closing rows, so positions are rebuilt from the exports themselves:
+# Bought fills open lots, Sold fills close them FIFO (or LIFO).
+# Quantities are matched as integers of QUANTITY_SCALE units, which covers
+# the 8 decimals coins are quoted in without float dust.
+QUANTITY_SCALE = 10 ** 8
+FILL_KEY = ["Date", "Name", "Action", "Quantity", "Price"]
+
+
+def parse_quantity(values):
+    # "0.00910021 BTC", "2 shares", "1,250 DOGE" -> float
+    return (
+        values.astype(str)
+        .str.extract(r"^\s*([-\d.,]+)", expand=False)
+        .str.replace(",", "", regex=False)
+        .astype(float)
+    )
+
+
+def export_fills(paths):
+    # Every Bought/Sold fill of the exports, oldest first, with full timestamps.
+    frames = []
+    for path in paths:
+        for chunk in iter_export_chunks(path):
+            chunk = chunk[chunk["Action"].isin(["Bought", "Sold"])]
+            frames.append(pd.DataFrame({
+                "Date": pd.to_datetime(chunk["Date"], format=EXPORT_DATE_FORMAT, errors="coerce").dt.tz_localize(None),
+                "Name": chunk["Name"],
+                "Action": chunk["Action"],
+                "Quantity": parse_quantity(chunk["Quantity"]),
+                "Price": parse_currency(chunk["Price"]),
+                "Total Position PnL": parse_currency(chunk["Total Position PnL"].fillna("")).where(
+                    chunk["Total Position PnL"].notna() & (chunk["Total Position PnL"].astype(str).str.strip() != "")),
+            }))
+    if not frames:
+        return pd.DataFrame(columns=["Date", "Name", "Action", "Quantity", "Price", "Total Position PnL"])
+    fills = pd.concat(frames, ignore_index=True).dropna(subset=["Date"])
+    # Overlapping exports list the same fill more than once.
+    fills = fills.drop_duplicates(subset=FILL_KEY)
+    return order_fills(fills)
+
+
+def order_fills(fills):
+    # Per instrument by time; within one timestamp buys go first, so a
+    # same-minute round trip never looks like a sell from nothing.
+    names = pd.factorize(fills["Name"], sort=True)[0]
+    order = np.lexsort([fills["Action"].to_numpy() == "Sold", fills["Date"].to_numpy(), names])
+    return fills.iloc[order].reset_index(drop=True)
+
+
+def _opening_lots(fills):
+    # Sells beyond what the fills ever bought belong to lots opened before
+    # the first export. One lot of unknown price per instrument covers them,
+    # so the position never goes below zero.
+    signed = np.where(fills["Action"].to_numpy() == "Sold", -1, 1) * fills["units"].to_numpy()
+    position = pd.Series(signed).groupby(fills["Name"].to_numpy(), sort=False).cumsum()
+    deficit = (-position).groupby(fills["Name"].to_numpy(), sort=False).max().clip(lower=0)
+    deficit = deficit[deficit > 0]
+    first = fills.groupby("Name", sort=False)["Date"].min()
+    return pd.DataFrame({
+        "Date": first[deficit.index].to_numpy() - pd.Timedelta(1, "ns"),
+        "Name": deficit.index,
+        "Action": "Bought",
+        "Quantity": deficit.to_numpy() / QUANTITY_SCALE,
+        "Price": np.nan,
+        "Total Position PnL": np.nan,
+        "units": deficit.to_numpy().astype(np.int64),
+        "carried": True,
+    })
+
+
+def _prepare(fills):
+    fills = fills.assign(
+        units=np.rint(fills["Quantity"].to_numpy(dtype=float) * QUANTITY_SCALE).astype(np.int64),
+        carried=False,
+    )
+    fills = order_fills(pd.concat([_opening_lots(fills), fills], ignore_index=True))
+    buys = fills[fills["Action"] == "Bought"]
+    sells = fills[fills["Action"] == "Sold"]
+    return fills, buys, sells
+
+
+def _fifo_pieces(buys, sells):
+    # FIFO on a long-only book consumes buy quantity in order, so sell j
+    # takes the cumulative buy range [sold before j, sold through j). With
+    # every instrument laid end to end on one quantity axis, each piece
+    # between two consecutive cumulative boundaries pairs one lot with one
+    # sell, found by searchsorted.
+    names = pd.Index(np.unique(buys["Name"].to_numpy()))
+    buy_code = names.get_indexer(buys["Name"])
+    sell_code = names.get_indexer(sells["Name"])
+    buy_units = buys["units"].to_numpy()
+    sell_units = sells["units"].to_numpy()
+    bought = np.bincount(buy_code, weights=buy_units, minlength=len(names)).astype(np.int64)
+    sold = np.bincount(sell_code, weights=sell_units, minlength=len(names)).astype(np.int64)
+    offset = np.concatenate([[0], np.cumsum(bought)[:-1]])
+
+    # Fills are ordered by instrument, so the running sums are monotone
+    # across the whole axis once each instrument starts at its offset.
+    buy_end = np.cumsum(buy_units)
+    sell_end = offset[sell_code] + np.cumsum(sell_units) - np.concatenate([[0], np.cumsum(sold)[:-1]])[sell_code]
+    sell_start = sell_end - sell_units
+
+    bounds = np.unique(np.concatenate([sell_start, sell_end, buy_end - buy_units, buy_end]))
+    start, end = bounds[:-1], bounds[1:]
+    sell = np.searchsorted(sell_end, start, side="right")
+    keep = sell < len(sell_end)
+    start, end, sell = start[keep], end[keep], sell[keep]
+    keep = start >= sell_start[sell]
+    start, end, sell = start[keep], end[keep], sell[keep]
+    lot = np.searchsorted(buy_end, start, side="right")
+    return lot, sell, end - start
+
+
+def _lifo_pieces(buys, sells):
+    # LIFO depends on what was open at each sell, so it walks the fills of
+    # each instrument with a stack of lots.
+    lots, closes, sizes = [], [], []
+    buy_at = buys.groupby("Name", sort=False).indices
+    sell_at = sells.groupby("Name", sort=False).indices
+    buy_dates = buys["Date"].to_numpy()
+    buy_units = buys["units"].to_numpy()
+    sell_dates = sells["Date"].to_numpy()
+    sell_units = sells["units"].to_numpy()
+    for name, sell_rows in sell_at.items():
+        buy_rows = buy_at.get(name, np.array([], dtype=int))
+        stack, next_buy = [], 0
+        for sell in sell_rows:
+            while next_buy < len(buy_rows) and buy_dates[buy_rows[next_buy]] <= sell_dates[sell]:
+                stack.append([buy_rows[next_buy], buy_units[buy_rows[next_buy]]])
+                next_buy += 1
+            remaining = sell_units[sell]
+            while remaining > 0 and stack:
+                take = min(remaining, stack[-1][1])
+                lots.append(stack[-1][0])
+                closes.append(sell)
+                sizes.append(take)
+                stack[-1][1] -= take
+                remaining -= take
+                if stack[-1][1] == 0:
+                    stack.pop()
+    return np.array(lots, dtype=int), np.array(closes, dtype=int), np.array(sizes, dtype=np.int64)
+
+
+@timed("lot matching")
+def match_lots(fills, method="fifo"):
+    """Match sells against the lots opened by buys, per instrument.
+
+    Returns (closes, open_lots): one row per Sold fill with its realized PnL
+    and quantity-weighted holding period, and the lots still open.
+    """
+    if method not in ("fifo", "lifo"):
+        raise ValueError(f"Unknown matching method: {method}")
+    fills, buys, sells = _prepare(fills)
+    lot, sell, units = (_fifo_pieces if method == "fifo" else _lifo_pieces)(buys, sells)
+
+    quantity = units / QUANTITY_SCALE
+    cost = quantity * buys["Price"].to_numpy()[lot]
+    held = (sells["Date"].to_numpy()[sell] - buys["Date"].to_numpy()[lot]) / np.timedelta64(1, "s")
+    carried = buys["carried"].to_numpy()[lot]
+
+    def per_sell(values):
+        return np.bincount(sell, weights=values, minlength=len(sells))
+
+    matched = per_sell(quantity)
+    closes = sells[["Date", "Name", "Quantity", "Price", "Total Position PnL"]].reset_index(drop=True)
+    closes = closes.rename(columns={"Total Position PnL": "Broker PnL"})
+    closes["Cost"] = per_sell(np.nan_to_num(cost))
+    closes["Realized PnL"] = matched * closes["Price"].to_numpy() - closes["Cost"]
+    # A sell that reaches into lots opened before the exports has no known cost.
+    closes.loc[per_sell(carried) > 0, ["Cost", "Realized PnL"]] = np.nan
+    with np.errstate(divide="ignore", invalid="ignore"):
+        seconds = np.where(matched > 0, per_sell(np.where(carried, 0, held * quantity)) / per_sell(np.where(carried, 0, quantity)), np.nan)
+    closes["Holding Period"] = pd.to_timedelta(seconds, unit="s")
+
+    open_units = buys["units"].to_numpy() - np.bincount(lot, weights=units, minlength=len(buys)).astype(np.int64)
+    open_lots = buys.loc[open_units > 0, ["Date", "Name", "Price", "carried"]].reset_index(drop=True)
+    open_lots.insert(2, "Quantity", open_units[open_units > 0] / QUANTITY_SCALE)
+    open_lots["Cost"] = open_lots["Quantity"] * open_lots["Price"]
+    return closes, open_lots
+
+
+def open_exposure(open_lots, fills):
+    # Open quantity and cost per instrument, marked at the last fill price.
+    last_price = fills.groupby("Name")["Price"].last()
+    exposure = open_lots.groupby("Name").agg(
+        Quantity=("Quantity", "sum"), Cost=("Cost", "sum"), Lots=("Quantity", "size"), Since=("Date", "min"))
+    exposure["Avg Price"] = exposure["Cost"] / exposure["Quantity"]
+    exposure["Last Price"] = last_price.reindex(exposure.index)
+    exposure["Market Value"] = exposure["Quantity"] * exposure["Last Price"]
+    exposure["Unrealized PnL"] = exposure["Market Value"] - exposure["Cost"]
+    return exposure.reset_index()
+
+
+def position_check(closes):
+    # Realized PnL summed per position (flat to flat), next to the broker's
+    # Total Position PnL on the fill that closed it; the gap is mostly fees.
+    flagged = closes[closes["Broker PnL"].notna()]
+    position = closes["Broker PnL"].notna()[::-1].groupby(closes["Name"][::-1]).cumsum()[::-1]
+    realized = closes.groupby([closes["Name"], position])["Realized PnL"].sum(min_count=1)
+    check = flagged[["Date", "Name", "Broker PnL"]].copy()
+    check["Realized PnL"] = realized.reindex(
+        pd.MultiIndex.from_arrays([flagged["Name"], position[flagged.index]])).to_numpy()
+    check["Difference"] = check["Broker PnL"] - check["Realized PnL"]
+    return check.reset_index(drop=True)
@@ -0,0 +1,47 @@
+import threading
+from collections import OrderedDict
+import profiling
+
+# Rendered stats, figures and HTML are cached per (journal version, view key).
+# The version is the token stamped into each journal write, so a new upload
+# only retires the entries of the version it replaced.
+RENDER_CACHE_SIZE = 256
+
+
+class VersionedLRU:
+    def __init__(self, maxsize=RENDER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, version, key, compute):
+        cache_key = (version, key)
+        with self.lock:
+            if cache_key in self.entries:
+                self.entries.move_to_end(cache_key)
+                self.hits += 1
+                profiling.count("render cache", "hits")
+                return self.entries[cache_key]
+            self.misses += 1
+            profiling.count("render cache", "misses")
+
+        value = compute()
+        with self.lock:
+            self.entries[cache_key] = value
+            self.entries.move_to_end(cache_key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return value
+
+    def invalidate(self, version):
+        with self.lock:
+            for cache_key in [k for k in self.entries if k[0] == version]:
+                del self.entries[cache_key]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+render_cache = VersionedLRU()
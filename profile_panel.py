@@ -0,0 +1,47 @@
+from collections import deque
+import pandas as pd
+import streamlit as st
+import profiling
+
+
+def finish_run():
+    # End this session's rerun and keep it in the session's own history.
+    run = profiling.end_run()
+    if run is not None:
+        st.session_state.setdefault("profile_runs", deque(maxlen=profiling.MAX_RUNS)).append(run)
+    return run
+
+
+def render_profile_panel(run):
+    # Sidebar panel with the timings of the rerun that just finished.
+    with st.sidebar.expander("⏱️ Profiling", expanded=True):
+        if run is None:
+            st.caption("Timings start with the next rerun.")
+            return
+        st.caption(f"Last rerun: {run['duration_ms']:.0f} ms, {len(run['spans'])} spans")
+
+        spans = pd.DataFrame(run["spans"])
+        if not spans.empty:
+            spans["stage"] = spans["depth"].map(lambda depth: "· " * depth) + spans["name"]
+            columns = ["stage", "duration_ms"] + [c for c in ("rows", "bytes") if c in spans]
+            st.dataframe(spans[columns].round({"duration_ms": 1}), hide_index=True, use_container_width=True)
+
+        rates = []
+        for name, counts in run["counters"].items():
+            rate = profiling.hit_rate(counts)
+            rates.append(f"{name}: {'—' if rate is None else f'{rate:.0%}'} ({counts.get('hits', 0)} hits, {counts.get('misses', 0)} misses)")
+        if rates:
+            st.caption("Cache hit rates this rerun")
+            st.text("\n".join(rates))
+
+        runs = list(st.session_state.get("profile_runs", []))
+        history = pd.DataFrame(
+            [{"rerun": i, **profiling.stage_totals(r)} for i, r in enumerate(runs)]
+        ).set_index("rerun")
+        if len(history) > 1:
+            st.caption("Stage times over recent reruns (ms)")
+            st.line_chart(history)
+
+        cols = st.columns(2)
+        cols[0].download_button("JSON", profiling.export_json(runs), "journal_profile.json", "application/json")
+        cols[1].download_button("Trace", profiling.export_trace(runs), "journal_trace.json", "application/json")
@@ -0,0 +1,187 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Opt-in stage timings. With profiling off, span() hands back one shared
+# no-op object, so instrumented code pays a flag check per stage.
+# Each dashboard session opts in for its own reruns (begin_run); spans and
+# cache counts land in that session's run only. JOURNAL_PROFILE=1 sets the
+# sessions' default and records spans outside any run, e.g. by the upload
+# thread, in `background`.
+enabled = os.environ.get("JOURNAL_PROFILE") == "1"
+MAX_RUNS = 20
+MAX_BACKGROUND_SPANS = 500
+
+background = deque(maxlen=MAX_BACKGROUND_SPANS)
+_local = threading.local()
+_lock = threading.Lock()
+
+
+def _active():
+    # Inside a rerun: whether that session opted in; elsewhere the env switch.
+    if getattr(_local, "in_run", False):
+        return _local.run is not None
+    return enabled
+
+
+def count(name, key, n=1):
+    # Bump a counter (e.g. cache hits) of the current session's rerun.
+    run = getattr(_local, "run", None)
+    if run is not None:
+        counts = run["counters"].setdefault(name, {})
+        counts[key] = counts.get(key, 0) + n
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = _local.__dict__.setdefault("stack", [])
+        self.depth = len(stack)
+        stack.append(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter_ns() - self.start
+        _local.stack.pop()
+        record = {
+            "name": self.name,
+            "start_us": self.start // 1000,
+            "duration_ms": duration / 1e6,
+            "depth": self.depth,
+            "thread": threading.current_thread().name,
+            **self.attrs,
+        }
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        run = getattr(_local, "run", None)
+        if run is not None:
+            run["spans"].append(record)
+        else:
+            with _lock:
+                background.append(record)
+        return False
+
+
+def span(name, **attrs):
+    # with span("stats", period=period) as s: ...; s.set(rows=len(df))
+    if not _active():
+        return _NULL_SPAN
+    return Span(name, attrs)
+
+
+def timed(name):
+    # Decorator form of span() for functions that are a stage on their own.
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _active():
+                return fn(*args, **kwargs)
+            with Span(name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def frame_size(df):
+    # Rows and shallow in-memory size of a frame, for span attributes.
+    return {"rows": len(df), "bytes": int(df.memory_usage(index=True).sum())}
+
+
+def begin_run(label="rerun", on=None):
+    # Spans recorded on this thread until end_run() belong to one rerun of
+    # one session; `on` is that session's opt-in (default: the env switch).
+    _local.in_run = True
+    if not (enabled if on is None else on):
+        _local.run = None
+        return
+    _local.run = {
+        "label": label,
+        "started": time.time(),
+        "start_ns": time.perf_counter_ns(),
+        "spans": [],
+        "counters": {},
+    }
+
+
+def end_run():
+    run = getattr(_local, "run", None)
+    _local.run = None
+    _local.in_run = False
+    if run is None:
+        return None
+    run["duration_ms"] = (time.perf_counter_ns() - run.pop("start_ns")) / 1e6
+    return run
+
+
+def hit_rate(counts):
+    # Share of lookups answered from cache, None before the first lookup.
+    hits = counts.get("hits", 0) + counts.get("fallbacks", 0)
+    lookups = hits + counts.get("misses", 0)
+    return hits / lookups if lookups else None
+
+
+def stage_totals(run):
+    # Total milliseconds per top-level stage of a run.
+    totals = {}
+    for record in run["spans"]:
+        if record["depth"] == 0:
+            totals[record["name"]] = totals.get(record["name"], 0.0) + record["duration_ms"]
+    return totals
+
+
+def export_json(runs):
+    with _lock:
+        return json.dumps({"runs": list(runs), "background": list(background)}, indent=2, default=str)
+
+
+def export_trace(runs):
+    # Chrome trace events (chrome://tracing, Perfetto) for the given runs and
+    # the background spans.
+    with _lock:
+        records = [record for run in runs for record in run["spans"]] + list(background)
+    threads = {}
+    events = []
+    for record in records:
+        tid = threads.setdefault(record["thread"], len(threads) + 1)
+        args = {k: v for k, v in record.items() if k not in ("name", "start_us", "duration_ms", "depth", "thread")}
+        events.append({
+            "name": record["name"],
+            "ph": "X",
+            "ts": record["start_us"],
+            "dur": record["duration_ms"] * 1000,
+            "pid": os.getpid(),
+            "tid": tid,
+            "args": args,
+        })
+    for name, tid in threads.items():
+        events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}})
+    return json.dumps({"traceEvents": events}, default=str)
+
+
+def reset():
+    with _lock:
+        background.clear()
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import shutil
+import profiling
+
+# Local copies of remote objects, keyed by the remote fingerprint (eTag, or
+# update time and size), so an unchanged object is never transferred twice.
+CACHE_DIR = ".journal_cache"
+MANIFEST_FILE = "manifest.json"
+IMMUTABLE = "immutable"
+
+cache_stats = {"hits": 0, "misses": 0, "fallbacks": 0}
+
+
+def _count(key):
+    cache_stats[key] += 1
+    profiling.count("remote cache", key)
+
+
+def _manifest_path(cache_dir):
+    return os.path.join(cache_dir, MANIFEST_FILE)
+
+
+def _load_manifest(cache_dir):
+    try:
+        with open(_manifest_path(cache_dir)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_manifest(cache_dir, manifest):
+    tmp_path = _manifest_path(cache_dir) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, _manifest_path(cache_dir))
+
+
+def _blob_name(storage_path, fingerprint):
+    return hashlib.sha256(f"{storage_path}\0{fingerprint}".encode()).hexdigest()
+
+
+def remote_fingerprint(bucket_api, storage_path):
+    # Metadata only; returns None when the object does not exist.
+    folder, name = os.path.split(storage_path)
+    for entry in bucket_api.list(folder, {"search": name}) or []:
+        if entry.get("name") != name:
+            continue
+        metadata = entry.get("metadata") or {}
+        if metadata.get("eTag"):
+            return metadata["eTag"].strip('"')
+        return f"{entry.get('updated_at')}:{metadata.get('size')}"
+    return None
+
+
+def _store_blob(cache_dir, manifest, slot, storage_path, fingerprint, write):
+    os.makedirs(cache_dir, exist_ok=True)
+    blob = _blob_name(storage_path, fingerprint)
+    blob_path = os.path.join(cache_dir, blob)
+    tmp_path = blob_path + ".tmp"
+    write(tmp_path)
+    os.replace(tmp_path, blob_path)
+
+    # Only the last good copy per slot is kept.
+    previous = manifest.get(slot, {}).get("blob")
+    if previous and previous != blob:
+        try:
+            os.remove(os.path.join(cache_dir, previous))
+        except FileNotFoundError:
+            pass
+    manifest[slot] = {"object": storage_path, "fingerprint": fingerprint, "blob": blob}
+    _save_manifest(cache_dir, manifest)
+    return blob_path
+
+
+def _copy_to(blob_path, local_path):
+    tmp_path = f"{local_path}.tmp"
+    shutil.copyfile(blob_path, tmp_path)
+    os.replace(tmp_path, local_path)
+
+
+def _cached_blob(bucket_api, storage_path, cache_dir, slot=None, immutable=False):
+    # Path of an up-to-date cached copy of the object, None if it does not exist.
+    # A slot groups the successive objects standing for one logical file (e.g.
+    # versioned keys of the journal); immutable objects are never re-checked.
+    slot = slot or storage_path
+    manifest = _load_manifest(cache_dir)
+    entry = manifest.get(slot)
+    blob_path = os.path.join(cache_dir, entry["blob"]) if entry else None
+    # The slot may hold another object's blob (an older version); that one is
+    # neither a hit nor a fallback for this object.
+    cached = blob_path is not None and os.path.exists(blob_path) and entry.get("object") == storage_path
+
+    if immutable and cached:
+        _count("hits")
+        return blob_path
+
+    try:
+        fingerprint = IMMUTABLE if immutable else remote_fingerprint(bucket_api, storage_path)
+        if fingerprint is None:
+            return None
+        hit = cached and entry["fingerprint"] == fingerprint
+        data = None if hit else bucket_api.download(storage_path)
+    except Exception as e:
+        # Only a mutable object can fall back to its own last good copy; an
+        # immutable one that is cached never gets here.
+        if cached:
+            _count("fallbacks")
+            print("⚠️ Remote unreachable, using last good copy:", e)
+            return blob_path
+        raise
+
+    if hit:
+        _count("hits")
+        return blob_path
+
+    _count("misses")
+
+    def write(path):
+        with open(path, "wb") as f:
+            f.write(data)
+
+    return _store_blob(cache_dir, manifest, slot, storage_path, fingerprint, write)
+
+
+def cached_download(bucket_api, storage_path, local_path, cache_dir=CACHE_DIR, slot=None, immutable=False):
+    """Copy the remote object to local_path, transferring it only when it changed.
+
+    Returns True when local_path holds the object (fresh, cached or, if the
+    remote is unreachable, the last good copy of this same object) and False
+    otherwise; an unreachable remote without such a copy raises.
+    """
+    blob_path = _cached_blob(bucket_api, storage_path, cache_dir, slot, immutable)
+    if blob_path is None:
+        return False
+    _copy_to(blob_path, local_path)
+    return True
+
+
+def cached_read(bucket_api, storage_path, cache_dir=CACHE_DIR):
+    # Contents of a small remote object (e.g. a pointer), None if it does not exist.
+    blob_path = _cached_blob(bucket_api, storage_path, cache_dir)
+    if blob_path is None:
+        return None
+    with open(blob_path, "rb") as f:
+        return f.read()
+
+
+def remember_upload(bucket_api, storage_path, local_path, cache_dir=CACHE_DIR, slot=None, immutable=False):
+    # Seed the cache with a file we just uploaded so the next read is a hit.
+    fingerprint = IMMUTABLE if immutable else remote_fingerprint(bucket_api, storage_path)
+    if fingerprint is None:
+        return
+    manifest = _load_manifest(cache_dir)
+    _store_blob(cache_dir, manifest, slot or storage_path, storage_path, fingerprint,
+                lambda path: shutil.copyfile(local_path, path))
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+# Rolling performance over the last N trades or the last N calendar days,
+# evaluated at the close of every trading day so it lines up with the
+# equity curve. Every window is a difference of two prefix sums, so a whole
+# series costs O(n) however wide the window is. Windows that reach back past
+# the first trade are left empty rather than averaged over fewer trades.
+BY = ["Trades", "Days"]
+TRADING_DAYS = 252
+DAY_NS = 86_400_000_000_000
+ROLLING_METRICS = ["Win Rate %", "Expectancy", "Avg Win", "Avg Loss", "Profit Factor", "Sharpe", "Sortino"]
+ROLLING_COLUMNS = ["Date", "Trades"] + ROLLING_METRICS
+
+
+def _prefix(values):
+    return np.concatenate([[0], np.cumsum(values)])
+
+
+def _divide(numerator, denominator, empty=np.nan):
+    out = np.full(len(numerator), empty, dtype=float)
+    np.divide(numerator, denominator, out=out, where=denominator != 0)
+    return out
+
+
+def trade_arrays(df):
+    # Trade timestamps (int64 ns) and PnL, sorted by date.
+    df = df[df["Date"].notna() & df["Total Position PnL"].notna()]
+    dates = pd.to_datetime(df["Date"]).to_numpy(dtype="datetime64[ns]").view(np.int64)
+    pnl = df["Total Position PnL"].to_numpy(dtype=float)
+    order = np.argsort(dates, kind="stable")
+    return dates[order], pnl[order]
+
+
+def rolling_metrics(dates, pnl, window, by="Trades"):
+    # One row per trading day. Win rate, expectancy and the averages use the
+    # definitions of metrics.calculate_overall_stats over the window's
+    # trades; Sharpe and Sortino are annualized over the daily PnL of the
+    # trading days the window spans.
+    if not len(pnl):
+        return pd.DataFrame({column: [] for column in ROLLING_COLUMNS})
+    day = dates // DAY_NS
+    day_first = np.concatenate([[0], np.flatnonzero(np.diff(day)) + 1])
+    day_end = np.append(day_first[1:], len(pnl))
+    day_values = day[day_first]
+    daily = np.add.reduceat(pnl, day_first)
+
+    if by == "Trades":
+        start = day_end - window
+        complete = start >= 0
+        start = np.maximum(start, 0)
+        day_start = np.searchsorted(day_values, day[start], "left")
+    else:
+        day_start = np.searchsorted(day_values, day_values - window + 1, "left")
+        complete = day_values - window + 1 >= day_values[0]
+        start = day_first[day_start]
+
+    def window_sum(values, first, last):
+        prefix = _prefix(values)
+        return prefix[last] - prefix[first]
+
+    trades = day_end - start
+    wins = window_sum(pnl > 0, start, day_end)
+    losses = window_sum(pnl < 0, start, day_end)
+    win_sum = window_sum(np.where(pnl > 0, pnl, 0.0), start, day_end)
+    loss_sum = window_sum(np.where(pnl < 0, pnl, 0.0), start, day_end)
+    win_rate = wins / trades
+    avg_win = _divide(win_sum, wins, 0.0)
+    avg_loss = _divide(loss_sum, losses, 0.0)
+
+    # Daily moments around the overall mean, which keeps the prefix sums of
+    # squares small enough not to cancel.
+    day_stop = np.arange(1, len(daily) + 1)
+    days = day_stop - day_start
+    centered = daily - daily.mean()
+    mean = window_sum(daily, day_start, day_stop) / days
+    centered_mean = window_sum(centered, day_start, day_stop) / days
+    squares = window_sum(centered ** 2, day_start, day_stop)
+    variance = np.maximum(squares - days * centered_mean ** 2, 0.0) / np.maximum(days - 1, 1)
+    downside = np.sqrt(window_sum(np.minimum(daily, 0.0) ** 2, day_start, day_stop) / days)
+    annualize = np.sqrt(TRADING_DAYS)
+    sharpe = np.where(days > 1, _divide(mean, np.sqrt(variance)), np.nan) * annualize
+    sortino = _divide(mean, downside) * annualize
+
+    table = pd.DataFrame({
+        "Date": day_values.astype("datetime64[D]").astype("datetime64[ns]"),
+        "Trades": trades,
+        "Win Rate %": win_rate * 100,
+        "Expectancy": win_rate * avg_win + (1 - win_rate) * avg_loss,
+        "Avg Win": avg_win,
+        "Avg Loss": avg_loss,
+        "Profit Factor": _divide(win_sum, -loss_sum),
+        "Sharpe": sharpe,
+        "Sortino": sortino,
+    })
+    table.loc[~complete, ROLLING_METRICS] = np.nan
+    return table
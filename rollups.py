@@ -0,0 +1,149 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Calendar rollup cube: PnL, trade count, wins and losses per day, ISO week
+# (keyed by its Monday), month and year. Every measure is a sum, so ingest
+# updates the stored cube by adding the new trades and subtracting the old
+# versions of changed ones, and any calendar period is an index lookup.
+LEVELS = ["day", "week", "month", "year"]
+MEASURES = ["PnL", "Trades", "Wins", "Losses"]
+CUBE_COLUMNS = ["Level", "Period"] + MEASURES
+
+
+def rollup_cube_path(journal_path):
+    return f"{journal_path}.rollup.parquet"
+
+
+def period_starts(days, level):
+    # First day of the day/week/month/year each datetime64[D] falls in.
+    if level == "day":
+        return days
+    if level == "week":
+        # 1970-01-01 was a Thursday; ISO weeks start on Monday.
+        return days - (days.view(np.int64) + 3) % 7
+    return days.astype("datetime64[M]" if level == "month" else "datetime64[Y]").astype("datetime64[D]")
+
+
+def day_rollup(df):
+    # The day level from journal rows: one row per trading day.
+    df = df[df["Total Position PnL"].notna() & df["Date"].notna()]
+    pnl = df["Total Position PnL"].to_numpy(dtype=float)
+    days = pd.to_datetime(df["Date"]).to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+    return pd.DataFrame({
+        "Period": days,
+        "PnL": pnl,
+        "Trades": np.ones(len(pnl), dtype=np.int64),
+        "Wins": (pnl > 0).astype(np.int64),
+        "Losses": (pnl < 0).astype(np.int64),
+    }).groupby("Period", sort=True).sum().reset_index()
+
+
+def cube_from_days(days):
+    # All four levels from the day level.
+    parts = []
+    day_values = days["Period"].to_numpy(dtype="datetime64[D]")
+    for level in LEVELS:
+        part = days[MEASURES].groupby(period_starts(day_values, level)).sum()
+        part.index = pd.DatetimeIndex(part.index).astype("datetime64[ns]")
+        parts.append(part.rename_axis("Period").reset_index().assign(Level=level))
+    return _sorted(pd.concat(parts, ignore_index=True))
+
+
+def build_rollup_cube(df):
+    return cube_from_days(day_rollup(df))
+
+
+def update_rollup_cube(cube, added, removed=None):
+    # Fold trades into the cube; `removed` are old versions of changed rows.
+    parts = [cube, build_rollup_cube(added)]
+    if removed is not None and len(removed):
+        retired = build_rollup_cube(removed)
+        retired[MEASURES] = -retired[MEASURES]
+        parts.append(retired)
+    cube = pd.concat(parts, ignore_index=True).groupby(["Level", "Period"], sort=False)[MEASURES].sum().reset_index()
+    return _sorted(cube[cube["Trades"] > 0])
+
+
+def _sorted(cube):
+    cube = cube[CUBE_COLUMNS].copy()
+    cube["Level"] = pd.Categorical(cube["Level"], categories=LEVELS)
+    cube["Trades"] = cube["Trades"].astype(np.int64)
+    cube["Wins"] = cube["Wins"].astype(np.int64)
+    cube["Losses"] = cube["Losses"].astype(np.int64)
+    return cube.sort_values(["Level", "Period"]).reset_index(drop=True)
+
+
+def level_table(cube, level):
+    # One level of the cube indexed by period start.
+    return cube[cube["Level"] == level].set_index("Period")[MEASURES]
+
+
+def period_stats(cube, level, when):
+    # Stats of the calendar period containing `when`, None without trades.
+    start = pd.Timestamp(period_starts(np.array([np.datetime64(pd.Timestamp(when), "D")]), level)[0])
+    table = level_table(cube, level)
+    if start not in table.index:
+        return None
+    row = table.loc[start]
+    return {
+        "start": start,
+        "pnl": float(row["PnL"]),
+        "trades": int(row["Trades"]),
+        "wins": int(row["Wins"]),
+        "losses": int(row["Losses"]),
+        "win_rate": float(row["Wins"] / row["Trades"] * 100),
+    }
+
+
+def period_over_period(cube, level, periods=12):
+    # The latest `periods` periods of a level next to the one before each.
+    table = level_table(cube, level)
+    table = table.assign(**{
+        "Win Rate %": table["Wins"] / table["Trades"] * 100,
+        "Prev PnL": table["PnL"].shift(1),
+    })
+    table["Change"] = table["PnL"] - table["Prev PnL"]
+    table = table.iloc[-periods:][::-1]
+    labels = {
+        "day": lambda p: p.strftime("%Y-%m-%d"),
+        "week": lambda p: f"{p.isocalendar()[0]}-W{p.isocalendar()[1]:02d}",
+        "month": lambda p: p.strftime("%Y-%m"),
+        "year": lambda p: p.strftime("%Y"),
+    }[level]
+    table.index = table.index.map(labels).rename("Period")
+    return table.reset_index()
+
+
+def read_rollup_cube(journal_path, token):
+    # Returns None when the stored cube is missing or from another journal write.
+    path = rollup_cube_path(journal_path)
+    if token is None or not os.path.exists(path):
+        return None
+    table = pq.read_table(path)
+    metadata = table.schema.metadata or {}
+    if metadata.get(b"journal_token", b"").decode() != token:
+        return None
+    return _sorted(table.to_pandas())
+
+
+def save_rollup_cube(journal_path, cube, token):
+    cube = cube.assign(Level=cube["Level"].astype(str))
+    table = pa.Table.from_pandas(cube[CUBE_COLUMNS], preserve_index=False)
+    table = table.replace_schema_metadata({"journal_token": token})
+    path = rollup_cube_path(journal_path)
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_rollup_cube(journal_path, df, token):
+    # Stored cube for this journal write, or built from df and stored.
+    cube = read_rollup_cube(journal_path, token)
+    if cube is None:
+        cube = build_rollup_cube(df)
+        if token is not None:
+            save_rollup_cube(journal_path, cube, token)
+    return cube
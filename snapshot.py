@@ -0,0 +1,62 @@
+import threading
+import pandas as pd
+from profiling import frame_size, span
+from storage import read_journal
+
+# One read-only copy of the journal per process, shared by every dashboard
+# session. Readers take a reference to the current snapshot and never copy
+# it; a new journal version is loaded once and swapped in by replacing that
+# reference, so sessions still drawing the old version finish undisturbed.
+CATEGORY_COLUMNS = ["Name", "Action"]
+
+_current = None
+_lock = threading.Lock()
+
+
+class JournalSnapshot:
+    def __init__(self, version, trades):
+        self.version = version
+        self.trades = trades
+
+
+def compact_trades(df):
+    # Completed trades with categorical Name/Action and float PnL; the
+    # numeric arrays are flagged read-only.
+    df = df.dropna(subset=["Date"])
+    df = df[df["Total Position PnL"].notna()].reset_index(drop=True)
+    columns = {column: df[column] for column in df.columns}
+    for column in CATEGORY_COLUMNS:
+        columns[column] = df[column].astype("category")
+    for column in ["Price", "Value", "Total Position PnL"]:
+        values = df[column].to_numpy(dtype=float, copy=True)
+        values.flags.writeable = False
+        columns[column] = pd.Series(values, index=df.index, name=column, copy=False)
+    return pd.DataFrame(columns, copy=False)
+
+
+def load_snapshot(journal_path, version):
+    with span("read journal (miss)") as s:
+        trades = compact_trades(read_journal(journal_path))
+        s.set(**frame_size(trades))
+    return JournalSnapshot(version, trades)
+
+
+def current_snapshot(journal_path, version):
+    # The shared snapshot of `version`, loaded by the first session asking.
+    global _current
+    snapshot = _current
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    with _lock:
+        if _current is None or _current.version != version:
+            _current = load_snapshot(journal_path, version)
+        return _current
+
+
+def swap_snapshot(journal_path, version):
+    # Called after an ingest: load the new version and make it current.
+    global _current
+    snapshot = load_snapshot(journal_path, version)
+    with _lock:
+        _current = snapshot
+    return snapshot
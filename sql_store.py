@@ -0,0 +1,345 @@
+import os
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from storage import ROW_COLUMN, base_token, journal_deltas, delta_segment_tokens, journal_lock, journal_token, read_journal
+from filters import period_start
+from profiling import timed
+
+# Optional SQLite copy of the journal, indexed on Date and Name. With
+# JOURNAL_SQL_STORE=1 the dashboard asks it for windows, symbol subsets,
+# daily rollups and history pages, so only the rows on screen reach pandas.
+SQL_STORE_ENABLED = os.environ.get("JOURNAL_SQL_STORE") == "1"
+INSERT_BATCH = 50_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS trades (
+    row INTEGER PRIMARY KEY,
+    date INTEGER,
+    name TEXT,
+    action TEXT,
+    quantity TEXT,
+    price REAL,
+    value REAL,
+    pnl REAL,
+    ratio TEXT,
+    notes TEXT
+);
+CREATE INDEX IF NOT EXISTS trades_date ON trades (date);
+CREATE INDEX IF NOT EXISTS trades_name_date ON trades (name, date);
+"""
+COLUMNS = {
+    "date": "Date",
+    "name": "Name",
+    "action": "Action",
+    "quantity": "Quantity",
+    "price": "Price",
+    "value": "Value",
+    "pnl": "Total Position PnL",
+    "ratio": "Ratio",
+    "notes": "Notes",
+}
+SELECT_COLUMNS = ", ".join(COLUMNS)
+# Completed trades only, as the dashboard shows them.
+BASE_CONDITION = "pnl IS NOT NULL AND date IS NOT NULL"
+
+
+def store_path(journal_path):
+    return f"{journal_path}.sqlite"
+
+
+def _to_ns(value):
+    return None if value is None else pd.Timestamp(value).value
+
+
+def _records(df, rows):
+    # Journal rows as SQLite tuples: dates as epoch nanoseconds, NaN as NULL.
+    dates = df["Date"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+    columns = [
+        rows,
+        np.where(df["Date"].isna().to_numpy(), None, dates).tolist(),
+    ]
+    for name in ["Name", "Action", "Quantity", "Price", "Value", "Total Position PnL", "Ratio", "Notes"]:
+        values = df[name].astype(object)
+        columns.append(values.where(values.notna(), None).tolist())
+    return zip(*columns)
+
+
+class JournalStore:
+    """SQLite mirror of one journal version.
+
+    It is kept next to the journal and brought up to date by applying the
+    journal's pending delta segments, or rebuilt after a new base.
+    """
+
+    def __init__(self, journal_path):
+        self.journal_path = journal_path
+        self.connection = sqlite3.connect(store_path(journal_path), check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.connection.executescript(SCHEMA)
+
+    @classmethod
+    def open(cls, journal_path):
+        store = cls(journal_path)
+        store.sync()
+        return store
+
+    def _meta(self, key):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @timed("sql sync")
+    def sync(self):
+        # The journal lock keeps the delta segments in place while they are read.
+        with journal_lock(self.journal_path), self.lock:
+            token = journal_token(self.journal_path)
+            if self._meta("token") == token:
+                return
+            base = base_token(self.journal_path)
+            deltas = journal_deltas(self.journal_path)
+            applied = [delta_segment_tokens(segment)[1] for segment in deltas]
+            with self.connection:
+                if self._meta("base") == base and self._meta("token") in [base] + applied:
+                    # Only the segments written since the last sync are new.
+                    start = 0 if self._meta("token") == base else applied.index(self._meta("token")) + 1
+                    for segment in deltas[start:]:
+                        delta = pq.read_table(segment).to_pandas()
+                        self._insert(delta, delta[ROW_COLUMN].tolist(), replace=True)
+                else:
+                    self.connection.execute("DELETE FROM trades")
+                    journal = read_journal(self.journal_path)
+                    self._insert(journal, list(range(len(journal))))
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO meta VALUES (?, ?)", [("base", base), ("token", token)]
+                )
+
+    def _insert(self, df, rows, replace=False):
+        verb = "INSERT OR REPLACE" if replace else "INSERT"
+        sql = f"{verb} INTO trades VALUES ({', '.join('?' * (len(COLUMNS) + 1))})"
+        for start in range(0, len(df), INSERT_BATCH):
+            block = df.iloc[start:start + INSERT_BATCH]
+            self.connection.executemany(sql, _records(block, rows[start:start + INSERT_BATCH]))
+
+    def _query(self, sql, params=()):
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def _frame(self, sql, params=()):
+        with self.lock:
+            df = pd.read_sql_query(sql, self.connection, params=params)
+        df = df.rename(columns=COLUMNS)
+        df["Date"] = pd.to_datetime(df["Date"], unit="ns")
+        return df
+
+    @staticmethod
+    def _where(start=None, end=None, names=None, action=None, pnl_min=None, pnl_max=None, pnl_sign=None):
+        # WHERE clause and parameters for a window; end is inclusive.
+        conditions, params = [BASE_CONDITION], []
+        if start is not None:
+            conditions.append("date >= ?")
+            params.append(_to_ns(start))
+        if end is not None:
+            conditions.append("date <= ?")
+            params.append(_to_ns(end))
+        if names:
+            conditions.append(f"name IN ({', '.join('?' * len(names))})")
+            params.extend(names)
+        if action:
+            conditions.append("action = ?")
+            params.append(action)
+        if pnl_min is not None:
+            conditions.append("pnl >= ?")
+            params.append(float(pnl_min))
+        if pnl_max is not None:
+            conditions.append("pnl <= ?")
+            params.append(float(pnl_max))
+        if pnl_sign == "Wins":
+            conditions.append("pnl > 0")
+        elif pnl_sign == "Losses":
+            conditions.append("pnl < 0")
+        return " AND ".join(conditions), params
+
+    # --- Lookups ---
+
+    def last_date(self):
+        (value,), = self._query(f"SELECT MAX(date) FROM trades WHERE {BASE_CONDITION}")
+        return None if value is None else pd.Timestamp(value)
+
+    def names(self):
+        return [name for name, in self._query(f"SELECT DISTINCT name FROM trades WHERE {BASE_CONDITION} ORDER BY name")]
+
+    def actions(self):
+        return [action for action, in self._query(f"SELECT DISTINCT action FROM trades WHERE {BASE_CONDITION} ORDER BY action")]
+
+    def pnl_range(self):
+        return tuple(self._query(f"SELECT MIN(pnl), MAX(pnl) FROM trades WHERE {BASE_CONDITION}")[0])
+
+    def count(self, **filters):
+        where, params = self._where(**filters)
+        return self._query(f"SELECT COUNT(*) FROM trades WHERE {where}", params)[0][0]
+
+    def trades(self, limit=None, offset=0, newest_first=False, **filters):
+        # Matching trades in journal order (or newest first), one page at a time.
+        where, params = self._where(**filters)
+        order = "date DESC, row ASC" if newest_first else "date ASC, row ASC"
+        sql = f"SELECT {SELECT_COLUMNS} FROM trades WHERE {where} ORDER BY {order}"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [int(limit), int(offset)]
+        return self._frame(sql, params)
+
+    def pnl_series(self):
+        # Per-trade PnL in journal order, for the risk simulation.
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT pnl FROM trades WHERE {BASE_CONDITION} ORDER BY date ASC, row ASC").fetchall()
+        return np.array(rows, dtype=float).ravel()
+
+    def trade_series(self):
+        # Trade timestamps (int64 ns) and PnL by date, as rolling.trade_arrays.
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT date, pnl FROM trades WHERE {BASE_CONDITION} ORDER BY date ASC, row ASC").fetchall()
+        return np.array([date for date, _ in rows], dtype=np.int64), np.array([pnl for _, pnl in rows], dtype=float)
+
+    def latest(self, n=5):
+        return self.trades(limit=n, newest_first=True)
+
+    # --- Aggregates ---
+
+    def daily_rollup(self, **filters):
+        # Daily PnL with running totals, the layout of daily_series.
+        where, params = self._where(**filters)
+        rows = self._query(
+            f"SELECT date / 86400000000000 AS day, SUM(pnl) FROM trades WHERE {where} GROUP BY day ORDER BY day",
+            params,
+        )
+        days = np.array([day for day, _ in rows], dtype=np.int64)
+        pnl = np.array([total for _, total in rows], dtype=float)
+        cumulative = np.cumsum(pnl)
+        peak = np.maximum.accumulate(cumulative) if len(cumulative) else cumulative
+        return pd.DataFrame({
+            "Date": pd.to_datetime(days, unit="D"),
+            "Total Position PnL": pnl,
+            "Cumulative PnL": cumulative,
+            "Running Peak": peak,
+            "Drawdown": cumulative - peak,
+        })
+
+    def day_rollup(self):
+        # The day level of the calendar cube (rollups.day_rollup).
+        rows = self._query(
+            "SELECT date / 86400000000000 AS day, TOTAL(pnl), COUNT(*),"
+            " COUNT(CASE WHEN pnl > 0 THEN 1 END), COUNT(CASE WHEN pnl < 0 THEN 1 END)"
+            f" FROM trades WHERE {BASE_CONDITION} GROUP BY day ORDER BY day"
+        )
+        days = pd.DataFrame(rows, columns=["Period", "PnL", "Trades", "Wins", "Losses"])
+        days["Period"] = days["Period"].to_numpy(dtype=np.int64).astype("datetime64[D]")
+        return days
+
+    def overall_stats(self, start=None, end=None, **filters):
+        # Same dict as metrics.calculate_overall_stats for the window.
+        where, params = self._where(start=start, end=end, **filters)
+        total, wins, losses, profit, max_win, max_loss, win_sum, loss_sum = self._query(
+            "SELECT COUNT(*), COUNT(CASE WHEN pnl > 0 THEN 1 END), COUNT(CASE WHEN pnl < 0 THEN 1 END),"
+            " TOTAL(pnl), MAX(pnl), MIN(pnl),"
+            " TOTAL(CASE WHEN pnl > 0 THEN pnl END), TOTAL(CASE WHEN pnl < 0 THEN pnl END)"
+            f" FROM trades WHERE {where}",
+            params,
+        )[0]
+        stats = {
+            "total": total,
+            "wins": wins,
+            "losses": losses,
+            "profit": profit,
+            "max_win": np.nan if max_win is None else max_win,
+            "max_loss": np.nan if max_loss is None else max_loss,
+            "win_rate": wins / total * 100 if total > 0 else 0,
+            "avg_win": win_sum / wins if wins else 0,
+            "avg_loss": loss_sum / losses if losses else 0,
+        }
+        stats["expectancy"] = (stats["win_rate"]/100 * stats["avg_win"]) + ((1 - stats["win_rate"]/100) * stats["avg_loss"])
+        stats["pnl_pct"] = stats["profit"]  # assumes base value 100
+        return stats
+
+    def filtered_stats(self, start=None, end=None, **filters):
+        # Same dict as metrics.calculate_filtered_stats, None for an empty window.
+        stats = self.overall_stats(start, end, **filters)
+        if stats["total"] == 0:
+            return None
+        # PnL booked before the window's first trade, as the starting balance.
+        where, params = self._where(start=start, end=end, **filters)
+        first = self._query(f"SELECT MIN(date) FROM trades WHERE {where}", params)[0][0]
+        where, params = self._where(end=pd.Timestamp(first) - pd.Timedelta(1), **filters)
+        stats["previous_pnl"] = self._query(f"SELECT TOTAL(pnl) FROM trades WHERE {where}", params)[0][0] + 100
+        stats["pnl_pct"] = (stats["profit"] / stats["previous_pnl"]) * 100 if stats["previous_pnl"] != 0 else 0
+        return stats
+
+    def instrument_rollup(self, window=None):
+        # instruments.raw_breakdown from one GROUP BY over the name index.
+        day = 86400000000000
+        first, last = (0, -1) if window is None else (
+            (_to_ns(window[0]) // day + 1) * day, (_to_ns(window[1]) // day + 1) * day)
+        with self.lock:
+            raw = pd.read_sql_query(
+                "SELECT COALESCE(name, '') AS Name, COUNT(*) AS trades, COUNT(CASE WHEN pnl > 0 THEN 1 END) AS wins,"
+                " COUNT(CASE WHEN pnl < 0 THEN 1 END) AS losses, TOTAL(pnl) AS total,"
+                " TOTAL(CASE WHEN pnl > 0 THEN pnl END) AS win_sum, TOTAL(CASE WHEN pnl < 0 THEN pnl END) AS loss_sum,"
+                " MAX(pnl) AS max_win, MIN(pnl) AS max_loss,"
+                " TOTAL(CASE WHEN date >= ? AND date < ? THEN pnl END) AS dd_pnl"
+                f" FROM trades WHERE {BASE_CONDITION} GROUP BY Name ORDER BY Name",
+                self.connection,
+                params=(first, last),
+            )
+        return raw
+
+    def period_stats(self, period, **filters):
+        last_date = self.last_date()
+        if last_date is None:
+            return None
+        return self.filtered_stats(period_start(period, last_date.normalize()), **filters)
+
+
+class SqlTradeView:
+    """TradeView backed by a JournalStore: pages are fetched by SQL.
+
+    select() returns a SqlSelection standing in for the position array.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.names = pd.Index(store.names())
+        self.actions = pd.Index(store.actions())
+        self.total = store.count()
+        self.bounds = store.pnl_range()
+
+    def __len__(self):
+        return self.total
+
+    def pnl_range(self):
+        return self.bounds
+
+    def select(self, names=None, action=None, start=None, end=None, pnl_sign=None, pnl_min=None, pnl_max=None):
+        filters = dict(names=names, action=action, start=start, end=end,
+                       pnl_sign=pnl_sign, pnl_min=pnl_min, pnl_max=pnl_max)
+        return SqlSelection(filters, self.store.count(**filters))
+
+    def page(self, selection, page, page_size):
+        return self.store.trades(limit=page_size, offset=(page - 1) * page_size, newest_first=True,
+                                 **selection.filters)
+
+
+class SqlSelection:
+    def __init__(self, filters, size):
+        self.filters = filters
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, key):
+        return range(self.size)[key]
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+from filters import period_start
+
+
+def _sparse_table(values, op):
+    # levels[k][i] = op over values[i : i + 2**k]
+    levels = [values]
+    width = 1
+    while 2 * width <= len(values):
+        previous = levels[-1]
+        levels.append(op(previous[:-width], previous[width:]))
+        width *= 2
+    return levels
+
+
+def _range_query(levels, op, start, end):
+    # op over values[start:end] from two overlapping power-of-two blocks.
+    level = (end - start).bit_length() - 1
+    table = levels[level]
+    return op(table[start], table[end - (1 << level)])
+
+
+class StatsEngine:
+    """Window statistics over a date-sorted journal from prefix arrays.
+
+    Each query is two binary searches on the dates plus O(1) lookups, so the
+    chip windows and any custom date range cost the same and copy no frames.
+    """
+
+    def __init__(self, df):
+        df = df[df["Date"].notna() & df["Total Position PnL"].notna()]
+        dates = pd.to_datetime(df["Date"]).to_numpy(dtype="datetime64[ns]")
+        pnl = df["Total Position PnL"].to_numpy(dtype=float)
+        order = np.argsort(dates, kind="stable")
+        self.dates = dates[order]
+        pnl = pnl[order]
+
+        def prefix(values):
+            return np.concatenate([[0], np.cumsum(values)])
+
+        self.cum_pnl = prefix(pnl)
+        self.cum_wins = prefix(pnl > 0)
+        self.cum_losses = prefix(pnl < 0)
+        self.cum_win_sum = prefix(np.where(pnl > 0, pnl, 0.0))
+        self.cum_loss_sum = prefix(np.where(pnl < 0, pnl, 0.0))
+        self.max_table = _sparse_table(pnl, np.maximum)
+        self.min_table = _sparse_table(pnl, np.minimum)
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def last_date(self):
+        return pd.Timestamp(self.dates[-1]) if len(self.dates) else None
+
+    def _bounds(self, start=None, end=None):
+        # Row range [first, last) for start <= Date <= end.
+        first = 0 if start is None else int(np.searchsorted(self.dates, np.datetime64(start, "ns"), "left"))
+        last = len(self.dates) if end is None else int(np.searchsorted(self.dates, np.datetime64(end, "ns"), "right"))
+        return first, max(first, last)
+
+    def _stats(self, first, last):
+        total = last - first
+        wins = int(self.cum_wins[last] - self.cum_wins[first])
+        losses = int(self.cum_losses[last] - self.cum_losses[first])
+        win_sum = self.cum_win_sum[last] - self.cum_win_sum[first]
+        loss_sum = self.cum_loss_sum[last] - self.cum_loss_sum[first]
+
+        stats = {
+            "total": total,
+            "wins": wins,
+            "losses": losses,
+            "profit": float(self.cum_pnl[last] - self.cum_pnl[first]),
+            "max_win": float(_range_query(self.max_table, np.maximum, first, last)) if total else np.nan,
+            "max_loss": float(_range_query(self.min_table, np.minimum, first, last)) if total else np.nan,
+            "win_rate": wins / total * 100 if total > 0 else 0,
+            "avg_win": win_sum / wins if wins else 0,
+            "avg_loss": loss_sum / losses if losses else 0,
+        }
+
+        stats["expectancy"] = (stats["win_rate"]/100 * stats["avg_win"]) + ((1 - stats["win_rate"]/100) * stats["avg_loss"])
+        stats["pnl_pct"] = stats["profit"]  # assumes base value 100
+        return stats
+
+    def overall_stats(self, start=None, end=None):
+        # Same dict as metrics.calculate_overall_stats for the window.
+        return self._stats(*self._bounds(start, end))
+
+    def filtered_stats(self, start=None, end=None):
+        # Same dict as metrics.calculate_filtered_stats, None for an empty window.
+        first, last = self._bounds(start, end)
+        if first == last:
+            return None
+        stats = self._stats(first, last)
+        stats["previous_pnl"] = float(self.cum_pnl[first]) + 100
+        stats["pnl_pct"] = (stats["profit"] / stats["previous_pnl"]) * 100 if stats["previous_pnl"] != 0 else 0
+        return stats
+
+    def period_stats(self, period):
+        # Stats for a filter chip window ending on the latest trade day.
+        if not len(self.dates):
+            return None
+        return self.filtered_stats(period_start(period, self.last_date.normalize()))
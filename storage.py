@@ -0,0 +1,324 @@
+import os
+import sys
+import threading
+import uuid
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from profiling import timed
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of this process are serialized
+    fcntl = None
+
+# The canonical journal lives in a typed Parquet file. Excel is only used to
+# import broker exports / legacy journals and to export a copy for editing.
+JOURNAL_FILE = "trading_journal.parquet"
+LEGACY_JOURNAL_FILE = "trading_journal.xlsx"
+
+JOURNAL_COLUMNS = [
+    "Date", "Name", "Action", "Quantity", "Price", "Value",
+    "Total Position PnL", "Ratio", "Notes"
+]
+TEXT_COLUMNS = ["Name", "Action", "Quantity", "Ratio", "Notes"]
+NUMERIC_COLUMNS = ["Price", "Value", "Total Position PnL"]
+
+# Ingests append small delta segments next to the base snapshot; once they
+# pass either threshold they are compacted into a new base.
+ROW_COLUMN = "_row"
+COMPACT_MAX_DELTAS = 20
+COMPACT_DELTA_RATIO = 0.25
+# Bases are written in row groups so an ingest can read just the rows it
+# matched instead of the whole file.
+ROW_GROUP_ROWS = 65_536
+
+JOURNAL_SCHEMA = pa.schema([
+    ("Date", pa.timestamp("ns")),
+    ("Name", pa.string()),
+    ("Action", pa.string()),
+    ("Quantity", pa.string()),
+    ("Price", pa.float64()),
+    ("Value", pa.float64()),
+    ("Total Position PnL", pa.float64()),
+    ("Ratio", pa.string()),
+    ("Notes", pa.string()),
+])
+
+
+def empty_journal():
+    return JOURNAL_SCHEMA.empty_table().to_pandas()
+
+
+def normalize_journal(df):
+    # Coerce a frame (e.g. parsed from Excel) to the journal column types.
+    df = df.copy()
+    for col in JOURNAL_COLUMNS:
+        if col not in df.columns:
+            df[col] = None
+    df = df[JOURNAL_COLUMNS]
+
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce").dt.tz_localize(None).astype("datetime64[ns]")
+    for col in NUMERIC_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype(float)
+    for col in TEXT_COLUMNS:
+        df[col] = df[col].astype(str).replace({"nan": np.nan, "None": np.nan, "NaT": np.nan})
+    return df.reset_index(drop=True)
+
+
+_journal_locks = {}
+_journal_locks_guard = threading.Lock()
+
+
+def lock_path(path=JOURNAL_FILE):
+    return f"{path}.lock"
+
+
+@contextmanager
+def journal_lock(path=JOURNAL_FILE):
+    # Serializes commits to one journal (not to all of them): an RLock per
+    # journal for the threads of this process, flock on a lock file next to
+    # it for other processes. Re-entrant within a thread.
+    key = os.path.abspath(path)
+    with _journal_locks_guard:
+        entry = _journal_locks.setdefault(key, {"lock": threading.RLock(), "depth": 0, "file": None})
+    with entry["lock"]:
+        if entry["depth"] == 0 and fcntl is not None:
+            entry["file"] = open(lock_path(path), "a")
+            fcntl.flock(entry["file"], fcntl.LOCK_EX)
+        entry["depth"] += 1
+        try:
+            yield
+        finally:
+            entry["depth"] -= 1
+            if entry["depth"] == 0 and entry["file"] is not None:
+                fcntl.flock(entry["file"], fcntl.LOCK_UN)
+                entry["file"].close()
+                entry["file"] = None
+
+
+def _write_table(table, path):
+    # Write to a temp file and swap it in so readers never see a partial file.
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table, tmp_path, row_group_size=ROW_GROUP_ROWS)
+    with open(tmp_path, "rb+") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def delta_dir(path=JOURNAL_FILE):
+    return f"{path}.deltas"
+
+
+@timed("journal write")
+def write_journal(df, path=JOURNAL_FILE):
+    # Writes a new base snapshot, folding away any delta segments.
+    # Every write is stamped with a fresh token so sidecar files (e.g. the
+    # trade-key index) can tell whether they still describe this journal.
+    token = uuid.uuid4().hex
+    table = pa.Table.from_pandas(normalize_journal(df), schema=JOURNAL_SCHEMA, preserve_index=False)
+    table = table.replace_schema_metadata({"journal_token": token})
+    _write_table(table, path)
+    for segment in _delta_files(path):
+        os.remove(segment)
+    return token
+
+
+def base_token(path=JOURNAL_FILE):
+    # Only the Parquet footer is read here.
+    metadata = pq.read_schema(path).metadata or {}
+    token = metadata.get(b"journal_token")
+    return token.decode() if token else None
+
+
+def _delta_files(path):
+    folder = delta_dir(path)
+    if not os.path.isdir(folder):
+        return []
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder) if name.endswith(".parquet"))
+
+
+def delta_segment_tokens(segment):
+    # Segment files are named <seq>-<base token>-<token>.parquet.
+    _, base, token = os.path.basename(segment)[:-len(".parquet")].split("-")
+    return base, token
+
+
+def journal_deltas(path=JOURNAL_FILE):
+    # Delta segments on top of the current base, oldest first. Segments left
+    # over from an older base are ignored.
+    base = base_token(path)
+    return [segment for segment in _delta_files(path) if delta_segment_tokens(segment)[0] == base]
+
+
+def journal_token(path=JOURNAL_FILE):
+    # Version of the journal: the token of its latest write, base or delta.
+    deltas = journal_deltas(path)
+    return delta_segment_tokens(deltas[-1])[1] if deltas else base_token(path)
+
+
+@timed("journal write")
+def write_journal_delta(delta, path=JOURNAL_FILE):
+    # Writes the new or changed rows of one ingest as an immutable segment.
+    # `delta` is indexed by the row position each row takes in the journal.
+    token = uuid.uuid4().hex
+    base = base_token(path)
+    os.makedirs(delta_dir(path), exist_ok=True)
+    segment = os.path.join(delta_dir(path), f"{len(journal_deltas(path)) + 1:06d}-{base}-{token}.parquet")
+
+    table = pa.Table.from_pandas(normalize_journal(delta), schema=JOURNAL_SCHEMA, preserve_index=False)
+    table = table.append_column(ROW_COLUMN, pa.array(delta.index.to_numpy(dtype=np.int64)))
+    table = table.replace_schema_metadata({"journal_token": token, "base_token": base})
+    _write_table(table, segment)
+    return token
+
+
+def apply_delta(journal, delta):
+    # Rows positioned inside the journal replace it, the rest are appended.
+    if delta.empty:
+        return journal
+    journal = journal.copy()
+    size = len(journal)
+    changed = delta[delta.index < size]
+    for col in journal.columns:
+        journal.iloc[changed.index.to_numpy(), journal.columns.get_loc(col)] = changed[col].to_numpy()
+    appended = delta[delta.index >= size].sort_index()
+    if len(appended):
+        journal = pd.concat([journal, appended[journal.columns]], ignore_index=True)
+    return journal
+
+
+def _read_deltas(path, columns=None):
+    # Pending delta segments combined (later rows win), indexed by row.
+    deltas = journal_deltas(path)
+    if not deltas:
+        return None
+    delta_columns = None if columns is None else list(columns) + [ROW_COLUMN]
+    delta = pd.concat([pq.read_table(segment, columns=delta_columns).to_pandas() for segment in deltas])
+    return delta.drop_duplicates(subset=ROW_COLUMN, keep="last").set_index(ROW_COLUMN)
+
+
+@timed("journal read")
+def read_journal(path=JOURNAL_FILE, columns=None):
+    # Column projection and memory mapping keep cold loads cheap.
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    # Under the journal lock, so compaction or a sync cannot remove the delta
+    # segments between listing and reading them.
+    with journal_lock(path):
+        df = pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+        delta = _read_deltas(path, columns)
+
+    # Pending delta segments are applied once.
+    if delta is not None:
+        df = apply_delta(df, delta)
+    return df
+
+
+class JournalRows:
+    """The committed journal as an ingest sees it: its size, last trade date
+    and the rows at given positions, taken from the Parquet footer, the
+    pending deltas and the row groups holding those rows. Call it under the
+    journal lock; `frame()` loads everything for the rare full rewrite."""
+
+    def __init__(self, path, frame=None):
+        self.path = path
+        self._frame = frame
+        if frame is not None:
+            self.size = len(frame)
+            return
+        self._base = pq.ParquetFile(path, memory_map=True)
+        meta = self._base.metadata
+        self._group_starts = np.cumsum([0] + [meta.row_group(i).num_rows for i in range(meta.num_row_groups)])
+        self._delta = _read_deltas(path)
+        self.size = meta.num_rows
+        if self._delta is not None and len(self._delta):
+            self.size = max(self.size, int(self._delta.index.max()) + 1)
+
+    def __len__(self):
+        return self.size
+
+    def frame(self):
+        if self._frame is None:
+            self._frame = read_journal(self.path)
+        return self._frame
+
+    def last_date(self):
+        # From the column statistics; a delta that moved a trade's date can
+        # only make this later than the true last date, never earlier.
+        if self._frame is not None:
+            return self._frame["Date"].max()
+        meta = self._base.metadata
+        column = self._base.schema_arrow.get_field_index("Date")
+        dates = []
+        for i in range(meta.num_row_groups):
+            stats = meta.row_group(i).column(column).statistics
+            if stats is None or not stats.has_min_max:
+                return self.frame()["Date"].max()
+            dates.append(pd.Timestamp(stats.max))
+        if self._delta is not None:
+            dates.append(self._delta["Date"].max())
+        dates = [date for date in dates if pd.notna(date)]
+        return max(dates) if dates else pd.NaT
+
+    def take(self, positions):
+        # Current rows at these positions, in that order.
+        positions = np.asarray(positions, dtype=np.int64)
+        if self._frame is not None:
+            return self._frame.iloc[positions].reset_index(drop=True)
+        if not len(positions):
+            return empty_journal()
+        base = positions[positions < self._group_starts[-1]]
+        parts = []
+        if len(base):
+            groups = np.unique(np.searchsorted(self._group_starts, base, side="right") - 1)
+            table = self._base.read_row_groups(groups.tolist())
+            # Row position of every row read, to pick the wanted ones out.
+            read = np.concatenate([np.arange(self._group_starts[g], self._group_starts[g + 1]) for g in groups])
+            parts.append(table.take(np.searchsorted(read, base)).to_pandas().set_axis(base))
+        if self._delta is not None:
+            pending = self._delta[self._delta.index.isin(positions)]
+            if len(pending):
+                parts.append(pending[JOURNAL_COLUMNS])
+        rows = pd.concat(parts) if len(parts) > 1 else parts[0]
+        rows = rows[~rows.index.duplicated(keep="last")]
+        return rows.loc[positions].reset_index(drop=True)
+
+
+def should_compact(path=JOURNAL_FILE):
+    # Fold the deltas into a new base once there are many or they grow large.
+    deltas = journal_deltas(path)
+    if len(deltas) >= COMPACT_MAX_DELTAS:
+        return True
+    delta_bytes = sum(os.path.getsize(segment) for segment in deltas)
+    return delta_bytes > COMPACT_DELTA_RATIO * os.path.getsize(path)
+
+
+def migrate_excel_journal(xlsx_path=LEGACY_JOURNAL_FILE, path=JOURNAL_FILE):
+    df = normalize_journal(pd.read_excel(xlsx_path))
+    df["Date"] = df["Date"].dt.normalize()
+    df = df.sort_values("Date", kind="stable").reset_index(drop=True)
+    write_journal(df, path)
+    print(f"✅ Migrated {xlsx_path} to {path} ({len(df)} rows)")
+    return df
+
+
+def export_journal_excel(path=JOURNAL_FILE, xlsx_path=LEGACY_JOURNAL_FILE):
+    df = read_journal(path)
+    df.to_excel(xlsx_path, index=False)
+    print(f"✅ Exported {path} to {xlsx_path}")
+
+
+if __name__ == "__main__":
+    # python storage.py migrate [trading_journal.xlsx] [trading_journal.parquet]
+    # python storage.py export [trading_journal.parquet] [trading_journal.xlsx]
+    usage = "usage: python storage.py {migrate,export} [src] [dst]"
+    if len(sys.argv) < 2 or sys.argv[1] not in ("migrate", "export"):
+        sys.exit(usage)
+    command, args = sys.argv[1], sys.argv[2:]
+    if command == "migrate":
+        migrate_excel_journal(*args)
+    else:
+        export_journal_excel(*args)
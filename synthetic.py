@@ -0,0 +1,143 @@
+import os
+import numpy as np
+import pandas as pd
+import openpyxl
+from storage import normalize_journal
+
+# Synthetic broker exports and journals for benchmarks. Values use the exact
+# strings the broker writes, e.g. "₮87,910.0900", "$-5.34", "0.00910021 BTC",
+# "1 share" and "25.03.2025 7:32 PM UTC".
+INSTRUMENTS = [
+    # name, currency sign, unit, start price, quantity decimals
+    ("BTC/USDT", "₮", "BTC", 85000.0, 8),
+    ("ETH/USDT", "₮", "ETH", 3200.0, 8),
+    ("SOL/USDT", "₮", "SOL", 140.0, 8),
+    ("DOGE/USDT", "₮", "DOGE", 0.2, 8),
+    ("DOGE/USD", "$", "DOGE", 0.2, 8),
+    ("MSTR", "$", "share", 300.0, 0),
+    ("NVDA", "$", "share", 120.0, 0),
+    ("TSLA", "$", "share", 250.0, 0),
+    ("MARA", "$", "share", 18.0, 0),
+]
+START_DATE = "2015-01-01"
+# Fills are spread over at most this many years, so every size stays inside
+# the nanosecond timestamp range.
+MAX_YEARS = 30
+# One sheet holds at most this many fills below the header row.
+EXPORT_MAX_ROWS = 1_048_575
+EXPORT_COLUMNS = ["Name", "Action", "Quantity", "Price", "Value", "Date", "Total Position PnL"]
+
+
+def synthetic_fills(rows, seed=0, start=START_DATE):
+    # `rows` fills, oldest first, as numbers. Each position opens with a
+    # Bought fill (no PnL) and is closed by the next Sold fill, which carries
+    # the realised PnL.
+    rng = np.random.default_rng(seed)
+    positions = (rows + 1) // 2
+    instrument = rng.integers(0, len(INSTRUMENTS), positions)
+    names, signs, units, prices, decimals = (np.array(col, dtype=object) for col in zip(*INSTRUMENTS))
+
+    # Prices follow a random walk per instrument; the exit is a small move
+    # away from the entry.
+    entry = prices[instrument].astype(float)
+    for code in range(len(INSTRUMENTS)):
+        mask = instrument == code
+        entry[mask] *= np.exp(np.cumsum(rng.normal(0, 0.002, mask.sum())))
+    exit_ = entry * (1 + rng.normal(0.0003, 0.006, positions))
+
+    # Buys are a round notional; share counts are whole, coins have 8 decimals.
+    step = 10.0 ** -decimals[instrument].astype(float)
+    notional = rng.choice([100.0, 250.0, 400.0, 500.0, 800.0], positions)
+    quantity = np.maximum(step, np.floor(notional / entry / step) * step)
+    fees = np.round(quantity * entry * 0.001, 2)
+    pnl = np.round(quantity * (exit_ - entry) - fees, 2)
+
+    gap_minutes = min(72.0, MAX_YEARS * 525_600 / max(rows, 1))
+    minutes = np.cumsum(rng.exponential(gap_minutes, 2 * positions)).astype(np.int64)
+    dates = pd.Timestamp(start) + pd.to_timedelta(minutes, unit="min")
+
+    fills = pd.DataFrame({
+        "Name": np.repeat(names[instrument], 2),
+        "Action": np.tile(["Bought", "Sold"], positions),
+        "Quantity": np.repeat(quantity, 2),
+        "Unit": np.repeat(units[instrument], 2),
+        "Decimals": np.repeat(decimals[instrument], 2).astype(int),
+        "Currency": np.repeat(signs[instrument], 2),
+        "Price": np.round(np.column_stack([entry, exit_]).ravel(), 4),
+        "Date": dates,
+        "Total Position PnL": np.column_stack([np.full(positions, np.nan), pnl]).ravel(),
+    })
+    fills["Value"] = np.round(fills["Quantity"] * fills["Price"], 2)
+    return fills.iloc[:rows]
+
+
+def _money(values, signs, decimals):
+    return signs + values.map(f"{{:,.{decimals}f}}".format)
+
+
+def _quantity(fills):
+    quantity = pd.Series("", index=fills.index, dtype=object)
+    for places, group in fills.groupby("Decimals"):
+        quantity[group.index] = group["Quantity"].map(f"{{:.{places}f}}".format)
+    unit = fills["Unit"].where(~((fills["Unit"] == "share") & (fills["Quantity"] != 1)), "shares")
+    return quantity + " " + unit
+
+
+def export_frame(fills):
+    # The fills as the broker's export shows them: strings, newest first.
+    dates = fills["Date"]
+    hours = (dates.dt.hour % 12).replace(0, 12).astype(str)
+    export = pd.DataFrame({
+        "Name": fills["Name"],
+        "Action": fills["Action"],
+        "Quantity": _quantity(fills),
+        "Price": _money(fills["Price"], fills["Currency"], 4),
+        "Value": _money(fills["Value"], fills["Currency"], 2),
+        "Date": dates.dt.strftime("%d.%m.%Y ") + hours + dates.dt.strftime(":%M %p UTC"),
+        "Total Position PnL": _money(fills["Total Position PnL"], fills["Currency"], 2)
+                              .where(fills["Total Position PnL"].notna(), ""),
+    })
+    return export.iloc[::-1].reset_index(drop=True)
+
+
+def journal_frame(fills, notes_share=0.05, seed=0):
+    # The journal that ingesting the fills' export produces (days ascending,
+    # newest first within a day, as the export lists them), with some Notes
+    # and Ratio filled in as a user would.
+    closed = fills[fills["Total Position PnL"].notna()].iloc[::-1]
+    journal = pd.DataFrame({
+        "Date": closed["Date"].dt.normalize(),
+        "Name": closed["Name"],
+        "Action": closed["Action"],
+        "Quantity": _quantity(closed),
+        "Price": closed["Price"],
+        "Value": closed["Value"],
+        "Total Position PnL": closed["Total Position PnL"],
+    })
+    rng = np.random.default_rng(seed)
+    annotated = rng.random(len(journal)) < notes_share
+    journal["Notes"] = np.where(annotated, "synthetic note", None)
+    journal["Ratio"] = np.where(annotated, "1:2", None)
+    return normalize_journal(journal.sort_values("Date", kind="stable"))
+
+
+def write_export(export, path):
+    # One workbook in the broker's layout; write-only mode keeps memory flat.
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(pd.Timestamp.now().strftime("%Y.%m.%d %H-%M-%S"))
+    sheet.append(EXPORT_COLUMNS)
+    for row in export[EXPORT_COLUMNS].itertuples(index=False, name=None):
+        sheet.append(row)
+    workbook.save(path)
+    return path
+
+
+def write_exports(export, folder, prefix="latest_trades"):
+    # Exports longer than one sheet are split the way a user would download
+    # them: several files, newest first.
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for part, start in enumerate(range(0, max(len(export), 1), EXPORT_MAX_ROWS)):
+        path = os.path.join(folder, f"{prefix}_{part:03d}.xlsx")
+        paths.append(write_export(export.iloc[start:start + EXPORT_MAX_ROWS], path))
+    return paths
@@ -0,0 +1,125 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# A trade is identified by these columns; uploads are merged on them.
+TRADE_KEY = ["Date", "Name", "Action", "Quantity", "Price"]
+
+
+def trade_key_hashes(df):
+    key = pd.DataFrame({
+        "Date": pd.to_datetime(df["Date"], errors="coerce").astype("datetime64[ns]"),
+        "Name": df["Name"].astype(object).fillna("").astype(str),
+        "Action": df["Action"].astype(object).fillna("").astype(str),
+        "Quantity": df["Quantity"].fillna("").astype(str),
+        "Price": pd.to_numeric(df["Price"], errors="coerce").astype(float),
+    })
+    return pd.util.hash_pandas_object(key, index=False).to_numpy(dtype=np.uint64)
+
+
+# Keys added by an ingest go to a small side segment that is saved on its
+# own, so an ingest writes only what it added. The side is folded into the
+# main index once it grows past 1/FOLD_RATIO of it.
+FOLD_RATIO = 8
+
+
+def index_paths(journal_path):
+    return f"{journal_path}.idx.npy", f"{journal_path}.idx.json", f"{journal_path}.idx.side.npy"
+
+
+def _save_array(path, keys, rows):
+    data = np.empty(len(keys), dtype=[("key", np.uint64), ("row", np.int64)])
+    data["key"] = keys
+    data["row"] = rows
+    # np.save appends ".npy" to names without it, so keep the suffix last.
+    tmp_path = f"{path[:-4]}.tmp.npy"
+    np.save(tmp_path, data)
+    os.replace(tmp_path, path)
+
+
+def _find(keys, rows, hashes):
+    if len(keys) == 0:
+        return np.full(len(hashes), -1, dtype=np.int64)
+    slots = np.searchsorted(keys, hashes)
+    slots = np.minimum(slots, len(keys) - 1)
+    found = keys[slots] == hashes
+    return np.where(found, rows[slots], -1)
+
+
+def _insert(keys, rows, hashes, hash_rows):
+    # Merge sorted keys into sorted keys, one pass over both.
+    slots = np.searchsorted(keys, hashes)
+    return np.insert(keys, slots, hashes), np.insert(rows, slots, hash_rows)
+
+
+class TradeIndex:
+    """Sorted trade-key hashes mapped to the journal row holding that trade."""
+
+    def __init__(self, keys, rows, side_keys=None, side_rows=None, saved=False):
+        # `saved`: keys/rows are the main index file on disk as it is.
+        self.keys = keys
+        self.rows = rows
+        self.side_keys = np.empty(0, dtype=np.uint64) if side_keys is None else side_keys
+        self.side_rows = np.empty(0, dtype=np.int64) if side_rows is None else side_rows
+        self.saved = saved
+
+    @classmethod
+    def build(cls, df):
+        hashes = trade_key_hashes(df)
+        positions = np.arange(len(hashes), dtype=np.int64)
+        # Stable sort on the reversed array keeps the last row for repeated keys.
+        order = np.argsort(hashes[::-1], kind="stable")
+        keys, first = np.unique(hashes[::-1][order], return_index=True)
+        rows = positions[::-1][order][first]
+        return cls(keys, rows)
+
+    @classmethod
+    def load(cls, journal_path, token):
+        # Returns None when the index is missing or describes another journal write.
+        npy_path, meta_path, side_path = index_paths(journal_path)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if token is None or meta.get("token") != token:
+                return None
+            side_rows = meta.get("side", 0)
+            data = np.load(npy_path, mmap_mode="r")
+            side = np.load(side_path) if side_rows else data[:0]
+        except (FileNotFoundError, ValueError):
+            return None
+        if len(data) != meta.get("rows") or len(side) != side_rows:
+            return None
+        return cls(data["key"], data["row"], side["key"], side["row"], saved=True)
+
+    def save(self, journal_path, token):
+        npy_path, meta_path, side_path = index_paths(journal_path)
+        if not self.saved or len(self.side_keys) * FOLD_RATIO > len(self.keys):
+            if len(self.side_keys):
+                self.keys, self.rows = _insert(self.keys, self.rows, self.side_keys, self.side_rows)
+                self.side_keys, self.side_rows = self.side_keys[:0], self.side_rows[:0]
+            _save_array(npy_path, self.keys, self.rows)
+            self.saved = True
+        if len(self.side_keys):
+            _save_array(side_path, self.side_keys, self.side_rows)
+        with open(meta_path, "w") as f:
+            json.dump({"token": token, "rows": int(len(self.keys)), "side": int(len(self.side_keys))}, f)
+
+    def __len__(self):
+        return len(self.keys) + len(self.side_keys)
+
+    def lookup(self, hashes):
+        # Row position for each hash, -1 where the trade is not in the journal.
+        positions = _find(self.keys, self.rows, hashes)
+        if len(self.side_keys):
+            side = _find(self.side_keys, self.side_rows, hashes)
+            positions = np.where(side >= 0, side, positions)
+        return positions
+
+    def append(self, hashes, start_row):
+        # Insert keys for rows appended at start_row, start_row + 1, ...
+        # Only the side segment is touched.
+        rows = np.arange(start_row, start_row + len(hashes), dtype=np.int64)
+        order = np.argsort(hashes, kind="stable")
+        side_keys, side_rows = _insert(self.side_keys, self.side_rows, hashes[order], rows[order])
+        return TradeIndex(self.keys, self.rows, side_keys, side_rows, self.saved)
@@ -1,135 +1,651 @@
 import pandas as pd
-from datetime import datetime
-import shutil
+from datetime import datetime, timedelta, timezone
+import argparse
+import glob
+import json
+import tempfile
+import threading
+import time
 import os
 import numpy as np
-import os
-from dotenv import load_dotenv
-from supabase import create_client, Client
+from backends import get_storage
+from storage import (
+    JOURNAL_FILE,
+    empty_journal, normalize_journal, write_journal, write_journal_delta, apply_delta,
+    base_token, journal_token, journal_deltas, delta_dir, delta_segment_tokens, should_compact,
+    migrate_excel_journal, journal_lock, JournalRows
+)
+from daily_series import append_daily_series, build_daily_series, read_daily_series, save_daily_series
+from annotations import annotations_lock, append_records, make_record, read_annotations
+from rollups import build_rollup_cube, read_rollup_cube, save_rollup_cube, update_rollup_cube
+from ingest import iter_clean_trades, clean_exports
+from remote_cache import cached_download, cached_read, remember_upload
+from trade_index import TRADE_KEY, TradeIndex, trade_key_hashes
+from upload_queue import UploadQueue
+from profiling import timed
+
+# Numbered journal manifests kept in the bucket, and how old an object must
+# be before pruning may treat it as unused.
+MANIFESTS_KEPT = 20
+PRUNE_GRACE_SECONDS = 600
+CAS_ATTEMPTS = 5
+_upload_queue = None
+_upload_queue_lock = threading.Lock()
 
-load_dotenv()
+def current_pointer_path(storage_path):
+    return f"current/{storage_path}"
 
-url: str = os.environ.get("SUPABASE_URL")
-key: str = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(url, key)
 
+@timed("supabase download")
 def download_from_supabase(local_path="trading_journal.xlsx", bucket="trading-journal", storage_path="trading_journal.xlsx"):
     try:
-        res = supabase.storage.from_(bucket).download(storage_path)
-        with open(local_path, "wb") as f:
-            f.write(res)
+        bucket_api = get_storage().from_(bucket)
+        # Workbooks may sit behind a small "current" pointer to an immutable
+        # versioned key; ones uploaded before versioning have no pointer.
+        pointer = cached_read(bucket_api, current_pointer_path(storage_path))
+        # Only transferred when the remote object changed since the last download.
+        if pointer:
+            found = cached_download(bucket_api, pointer.decode().strip(), local_path, slot=storage_path, immutable=True)
+        else:
+            found = cached_download(bucket_api, storage_path, local_path)
+        if not found:
+            print("⚠️ File not found in Supabase:", storage_path)
+            return False
         print("✅ Downloaded from Supabase")
+        return True
     except Exception as e:
         print("⚠️ Could not download file from Supabase:", e)
+        return False
+
+
+def journal_object_key(storage_path, token, delta=False):
+    stem = os.path.splitext(storage_path)[0]
+    return f"versions/{stem}/{token}{'.delta' if delta else ''}.parquet"
+
+
+def journal_object_token(key):
+    return os.path.basename(key).split(".")[0]
+
+
+def parse_journal_manifest(pointer):
+    # The current pointer lists the base snapshot and its delta segments;
+    # older pointers held just the key of a full snapshot.
+    text = pointer.decode().strip()
+    if text.startswith("{"):
+        return json.loads(text)
+    return {"base": text, "deltas": []}
+
+
+def manifest_folder(storage_path):
+    return f"manifests/{os.path.splitext(storage_path)[0]}"
+
+
+def manifest_key(storage_path, seq):
+    return f"{manifest_folder(storage_path)}/{seq:08d}.json"
+
 
+def remote_state_path(master_file):
+    return f"{master_file}.remote.json"
 
-def upload_to_supabase(local_file_path, bucket="trading-journal", storage_path="trading_journal.xlsx"):
+
+def read_remote_state(master_file):
+    # Number of the bucket manifest the local journal was last synced to, and
+    # whether this journal published that manifest itself.
     try:
-        # Optional: Remove old version first
-        try:
-            supabase.storage.from_(bucket).remove([storage_path])
-        except Exception as e:
-            print("⚠️ Could not remove old file (probably doesn't exist):", e)
+        with open(remote_state_path(master_file)) as f:
+            state = json.load(f)
+        return {"seq": state["seq"], "published": state.get("published", False)}
+    except (FileNotFoundError, ValueError, KeyError):
+        return {"seq": 0, "published": False}
+
+
+def read_remote_seq(master_file):
+    return read_remote_state(master_file)["seq"]
+
+
+def save_remote_seq(master_file, seq, published=False):
+    tmp_path = remote_state_path(master_file) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"seq": seq, "published": published}, f)
+    os.replace(tmp_path, remote_state_path(master_file))
+
+
+def remote_head(bucket_api, storage_path):
+    # The newest numbered manifest and its number. Before the first numbered
+    # commit that is the legacy pointer's manifest (or None) as number 0.
+    numbers = [int(entry["name"][:-len(".json")])
+               for entry in bucket_api.list(manifest_folder(storage_path), {"limit": 1000}) or []
+               if entry["name"].endswith(".json")]
+    if numbers:
+        head = max(numbers)
+        return head, json.loads(bucket_api.download(manifest_key(storage_path, head)))
+    try:
+        return 0, parse_journal_manifest(bucket_api.download(current_pointer_path(storage_path)))
+    except Exception:
+        return 0, None
+
+
+def _manifest_exists(bucket_api, storage_path, seq):
+    name = os.path.basename(manifest_key(storage_path, seq))
+    entries = bucket_api.list(manifest_folder(storage_path), {"search": name}) or []
+    return any(entry["name"] == name for entry in entries)
+
 
-        # Upload new file
-        with open(local_file_path, "rb") as f:
-            supabase.storage.from_(bucket).upload(storage_path, f)
-        print("✅ Uploaded to Supabase")
+@timed("supabase upload")
+def publish_journal(storage_path, files, payload, bucket="trading-journal"):
+    """Publish a local commit with compare-and-swap on numbered manifests.
+
+    The commit was made on top of manifest number payload["parent"]. It
+    becomes number parent + 1 only if nobody took that number first (the
+    manifest is uploaded without upsert); otherwise it is re-based onto the
+    newer journal and queued again.
+    """
+    manifest = {"base": payload["base"], "deltas": payload["deltas"]}
+    parent = payload.get("parent")
+    try:
+        bucket_api = get_storage().from_(bucket)
+        for _ in range(CAS_ATTEMPTS):
+            head, previous = remote_head(bucket_api, storage_path)
+            # A head this journal published itself came from an earlier local
+            # commit, which this one was made on top of: fast-forward.
+            state = read_remote_state(payload["journal"]) if payload.get("journal") else None
+            own_head = state is not None and state["published"] and state["seq"] == head
+            if parent is not None and head > parent and not own_head:
+                return rebase_journal(payload["journal"], files, head, previous, bucket_api)
+
+            folder = os.path.dirname(manifest["base"])
+            remote = {entry["name"]: entry for entry in bucket_api.list(folder, {"limit": 1000}) or []}
+            for object_key in [manifest["base"]] + manifest["deltas"]:
+                name = os.path.basename(object_key)
+                if name in remote:
+                    continue
+                if name not in files:
+                    raise FileNotFoundError(f"no local copy of {object_key} to upload")
+                with open(files[name], "rb") as f:
+                    bucket_api.upload(object_key, f)
+
+            seq = head + 1
+            try:
+                bucket_api.upload(manifest_key(storage_path, seq), json.dumps(manifest).encode(), {"upsert": "false"})
+                break
+            except Exception:
+                if not _manifest_exists(bucket_api, storage_path, seq):
+                    raise
+                # Another session took this number first; look again.
+        else:
+            raise RuntimeError(f"still conflicting after {CAS_ATTEMPTS} attempts")
+
+        # The pointer is only a hint for readers; the numbered manifests decide.
+        pointer_path = current_pointer_path(storage_path)
+        pointer = json.dumps({"seq": seq, **manifest}).encode()
+        bucket_api.upload(pointer_path, pointer, {"upsert": "true"})
+        # Seed the cache with the new pointer, so an offline fallback never
+        # serves a pointer older than what this process published.
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(pointer)
+        remember_upload(bucket_api, pointer_path, f.name)
+        os.remove(f.name)
+        if payload.get("journal"):
+            save_remote_seq(payload["journal"], seq, published=True)
+        print(f"✅ Uploaded to Supabase as version {seq} ({len(manifest['deltas'])} pending deltas)")
+    except Exception as e:
+        print("⚠️ Could not upload journal to Supabase:", e)
+        return False
+
+    # Objects neither the new nor the previous manifest uses can go; keeping
+    # the previous set lets readers that just fetched the old pointer finish.
+    # Recent objects may belong to a commit another session is publishing.
+    try:
+        previous = previous or {"base": None, "deltas": []}
+        keep = {os.path.basename(k) for k in [manifest["base"], previous["base"]] + manifest["deltas"] + previous["deltas"] if k}
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=PRUNE_GRACE_SECONDS)).isoformat()
+        stale = [f"{folder}/{name}" for name, entry in remote.items()
+                 if name not in keep and (entry.get("updated_at") or "") < cutoff]
+        if seq > MANIFESTS_KEPT:
+            stale.append(manifest_key(storage_path, seq - MANIFESTS_KEPT))
+        if stale:
+            bucket_api.remove(stale)
+    except Exception as e:
+        print("⚠️ Could not prune old journal objects:", e)
+    return True
+
+
+def rebase_journal(master_file, files, head, manifest, bucket_api):
+    # Another session published first: take its journal and merge this
+    # commit's rows (the "changes-*" files queued with it) on top, which
+    # queues a new commit whose parent is the current head.
+    with journal_lock(master_file):
+        # Fetching drops every local commit the bucket lacks, so the change
+        # sets of commits still waiting in the outbox are applied again too.
+        queue = get_upload_queue()
+        files = {**{name: os.path.join(queue.objects_dir, name)
+                    for job in queue.pending(os.path.basename(master_file)) for name in job["files"]}, **files}
+        changes = sorted(name for name in files if name.startswith("changes-"))
+        print(f"⚠️ Journal version {head} was published meanwhile; re-basing {len(changes)} local change set(s)")
+        # Re-committing on a journal that failed to fetch would overwrite the
+        # other session's version; retry the whole publish later instead.
+        if manifest is None or not fetch_journal_manifest(bucket_api, master_file, manifest):
+            print("⚠️ Could not fetch journal version", head, "to re-base onto")
+            return False
+        save_remote_seq(master_file, head)
+        if changes:
+            commit_trades([pd.read_parquet(files[name]) for name in changes], master_file)
+    return True
+
+
+def enqueue_journal_upload(master_file, written, changes=None):
+    # Queue the journal's current manifest together with the file(s) this
+    # commit wrote, which is all the bucket is missing, plus the commit's
+    # own rows for re-basing it if another session publishes first.
+    storage_path = os.path.basename(master_file)
+    base = base_token(master_file)
+    deltas = journal_deltas(master_file)
+    manifest = {
+        "base": journal_object_key(storage_path, base),
+        "deltas": [journal_object_key(storage_path, delta_segment_tokens(segment)[1], delta=True) for segment in deltas],
+    }
+    files = {}
+    for path in written:
+        if path == master_file:
+            files[os.path.basename(manifest["base"])] = path
+        else:
+            token = delta_segment_tokens(path)[1]
+            files[os.path.basename(journal_object_key(storage_path, token, delta=True))] = path
+    payload = {**manifest, "parent": read_remote_seq(master_file), "journal": os.path.abspath(master_file)}
+    with tempfile.TemporaryDirectory() as folder:
+        if changes is not None and len(changes):
+            # Named by time, so re-basing applies change sets in commit order.
+            changes_path = os.path.join(folder, "changes.parquet")
+            changes.reset_index(drop=True).to_parquet(changes_path, index=False)
+            files[f"changes-{time.time_ns()}-{journal_token(master_file)}.parquet"] = changes_path
+        get_upload_queue().enqueue(storage_path, files, payload)
+
+
+def annotation_folder(storage_path):
+    return f"annotations/{os.path.splitext(storage_path)[0]}"
+
+
+def annotation_object_name(record):
+    # The edit time is part of the name, so a listing shows what is newer.
+    return f"{record['id']}.{record['updated']}.json"
+
+
+@timed("annotation upload")
+def publish_annotation(storage_path, record, bucket="trading-journal"):
+    # Upload one annotation record and drop older records of the same trade.
+    try:
+        bucket_api = get_storage().from_(bucket)
+        folder = annotation_folder(storage_path)
+        name = annotation_object_name(record)
+        bucket_api.upload(f"{folder}/{name}", json.dumps(record).encode(), {"upsert": "true"})
+        older = [entry["name"] for entry in bucket_api.list(folder, {"search": record["id"]}) or []
+                 if entry["name"].startswith(record["id"] + ".") and entry["name"] < name]
+        if older:
+            bucket_api.remove([f"{folder}/{old}" for old in older])
     except Exception as e:
-        print("⚠️ Could not upload file to Supabase:", e)
+        print("⚠️ Could not upload annotation to Supabase:", e)
+        return False
+    return True
 
 
+def publish(storage_path, files, payload):
+    # Upload queue entry point: annotation records or journal manifests.
+    if payload.get("annotation"):
+        return publish_annotation(payload["journal"], payload["annotation"])
+    return publish_journal(storage_path, files, payload)
 
-def update_trading_journal(latest_file, master_file):
-    # Load the latest trades (user-uploaded file)
-    latest_trades = pd.read_excel(latest_file)
 
-    latest_trades = latest_trades[
-        latest_trades["Total Position PnL"].notna() & 
-        (latest_trades["Total Position PnL"].astype(str).str.strip() != "")
+def save_annotation(master_file, trade_id, notes, ratio):
+    # One local record plus one queued upload; the journal is not touched.
+    record = make_record(trade_id, notes, ratio)
+    append_records(master_file, [record])
+    storage_path = os.path.basename(master_file)
+    get_upload_queue().enqueue(f"{annotation_folder(storage_path)}/{trade_id}",
+                               payload={"annotation": record, "journal": storage_path})
+    return record
+
+
+@timed("annotation sync")
+def sync_annotations(master_file=JOURNAL_FILE, bucket="trading-journal"):
+    # Fetch records edited elsewhere that are newer than the local ones.
+    try:
+        bucket_api = get_storage().from_(bucket)
+        folder = annotation_folder(os.path.basename(master_file))
+        names, offset = [], 0
+        while True:
+            page = bucket_api.list(folder, {"limit": 1000, "offset": offset}) or []
+            names += [entry["name"] for entry in page if entry["name"].endswith(".json")]
+            if len(page) != 1000:
+                break
+            offset += 1000
+        def newer(names):
+            local = read_annotations(master_file)["updated"]
+            for name in names:
+                trade_id, updated = name.split(".")[:2]
+                known = local.get(np.uint64(int(trade_id, 16)))
+                if known is None or int(updated) > known:
+                    yield name
+
+        records = {name: json.loads(bucket_api.download(f"{folder}/{name}")) for name in newer(names)}
+        # Checked again under the lock, so sessions syncing at once append
+        # each record only once.
+        with annotations_lock(master_file):
+            records = [records[name] for name in newer(records)]
+            append_records(master_file, records)
+        return len(records)
+    except Exception as e:
+        print("⚠️ Could not sync annotations from Supabase:", e)
+        return 0
+
+
+def get_upload_queue():
+    # One background uploader per process; it also drains jobs left in the
+    # outbox by a previous run.
+    global _upload_queue
+    with _upload_queue_lock:
+        if _upload_queue is None:
+            _upload_queue = UploadQueue(publish)
+            _upload_queue.start()
+    return _upload_queue
+
+
+def fetch_journal_manifest(bucket_api, master_file, manifest):
+    # Fetch the base snapshot only when it changed and each delta segment only
+    # once; the segments are then merged into the journal at read time.
+    storage_path = os.path.basename(master_file)
+    if not os.path.exists(master_file) or base_token(master_file) != journal_object_token(manifest["base"]):
+        if not cached_download(bucket_api, manifest["base"], master_file, slot=storage_path, immutable=True):
+            print("⚠️ File not found in Supabase:", manifest["base"])
+            return False
+    # The manifest's deltas only apply on top of its own base.
+    if base_token(master_file) != journal_object_token(manifest["base"]):
+        print("⚠️ Downloaded journal does not match", manifest["base"])
+        return False
+
+    # Segments are numbered in manifest order; a local copy whose number
+    # disagrees with the manifest is dropped and fetched again.
+    base = base_token(master_file)
+    os.makedirs(delta_dir(master_file), exist_ok=True)
+    wanted = [
+        os.path.join(delta_dir(master_file), f"{seq:06d}-{base}-{journal_object_token(object_key)}.parquet")
+        for seq, object_key in enumerate(manifest["deltas"], 1)
     ]
-    
-    
-    # Clean currency columns
-    currency_columns = ["Price", "Value", "Total Position PnL"]
-    for col in currency_columns:
-        latest_trades[col] = (
-            latest_trades[col]
-            .astype(str)
-            .str.replace(r"[₮$,]", "", regex=True)
-            .str.replace(",", "")
-            .str.strip()
-            .replace("", "0")
-            .astype(float)
-        )
-    
-    # Parse dates from latest trades.
-    # Example input: "04.03.2023 10:30 AM UTC"
-    latest_trades["Date"] = pd.to_datetime(
-        latest_trades["Date"],
-        format="%d.%m.%Y %I:%M %p %Z",  # includes the "UTC" part
-        errors='coerce',
-        dayfirst=True
-    ).dt.tz_localize(None).dt.normalize()
-    
-    # Load or create the master journal.
+    for segment in journal_deltas(master_file):
+        if segment not in wanted:
+            os.remove(segment)
+    for object_key, target in zip(manifest["deltas"], wanted):
+        if os.path.exists(target):
+            continue
+        with open(target + ".tmp", "wb") as f:
+            f.write(bucket_api.download(object_key))
+        os.replace(target + ".tmp", target)
+    return True
+
+
+@timed("supabase download")
+def download_journal_from_supabase(master_file=JOURNAL_FILE, bucket="trading-journal"):
+    storage_path = os.path.basename(master_file)
     try:
-        download_from_supabase(local_path=master_file)
-        master_journal = pd.read_excel(master_file)
+        bucket_api = get_storage().from_(bucket)
+        # The newest numbered manifest is the journal; the current pointer may
+        # lag behind it when two sessions publish at once.
+        try:
+            seq, manifest = remote_head(bucket_api, storage_path)
+        except Exception as e:
+            # Offline: the last pointer this process saw or published.
+            print("⚠️ Could not list journal versions, using the current pointer:", e)
+            pointer = cached_read(bucket_api, current_pointer_path(storage_path))
+            manifest = parse_journal_manifest(pointer) if pointer is not None else None
+            seq = manifest.get("seq", 0) if manifest is not None else 0
+        if manifest is None:
+            # Journals uploaded before versioning are plain objects.
+            return download_from_supabase(local_path=master_file, bucket=bucket, storage_path=storage_path)
+        with journal_lock(master_file):
+            if not fetch_journal_manifest(bucket_api, master_file, manifest):
+                return False
+            save_remote_seq(master_file, seq)
+        print(f"✅ Downloaded from Supabase ({len(manifest['deltas'])} deltas)")
+        return True
+    except Exception as e:
+        print("⚠️ Could not download journal from Supabase:", e)
+        return False
+
+
+@timed("sync")
+def sync_master_journal(master_file=JOURNAL_FILE):
+    # Bring the local journal and its annotations up to date with the bucket.
+    storage_path = os.path.basename(master_file)
+    sync_annotations(master_file)
+    # Local commits still waiting in the outbox are newer than the bucket copy.
+    if os.path.exists(master_file) and get_upload_queue().pending(storage_path):
+        return
+    if download_journal_from_supabase(master_file) or os.path.exists(master_file):
+        return
+
+    # One-shot migration: no Parquet journal yet, convert this journal's
+    # legacy workbook (trading_journal.xlsx for trading_journal.parquet).
+    legacy_file = os.path.splitext(master_file)[0] + ".xlsx"
+    if download_from_supabase(local_path=legacy_file, storage_path=os.path.basename(legacy_file)) \
+            or os.path.exists(legacy_file):
+        with journal_lock(master_file):
+            migrate_excel_journal(legacy_file, master_file)
+            enqueue_journal_upload(master_file, [master_file])
+        return
+
+    raise FileNotFoundError(master_file)
+
+
+def _rows_at(journal, delta, positions):
+    # Current rows at these journal positions, pending delta rows included.
+    in_delta = np.isin(positions, delta.index.to_numpy())
+    if not in_delta.any():
+        return journal.take(positions)
+    if in_delta.all():
+        return delta.loc[positions].reset_index(drop=True)
+    stored = positions[~in_delta]
+    rows = pd.concat([journal.take(stored).set_axis(stored), delta.loc[positions[in_delta]]])
+    return rows.loc[positions].reset_index(drop=True)
+
+
+@timed("merge")
+def merge_trades(journal, latest_trades, index, delta):
+    # Merge cleaned trades into the pending delta (rows indexed by their
+    # journal position), touching only trades whose key is new or whose
+    # values changed. `journal` is a JournalRows, so only matched rows are read. Returns the delta, the updated index and the number of
+    # changed and added rows.
+    latest_trades = normalize_journal(latest_trades)
+    latest_trades = latest_trades.drop_duplicates(subset=TRADE_KEY, keep="last")
+    latest_trades = latest_trades.sort_values("Date", kind="stable").reset_index(drop=True)
+    hashes = trade_key_hashes(latest_trades)
+    positions = index.lookup(hashes)
+    existing = positions >= 0
+
+    # Preserve old Notes and Ratio if present.
+    old = _rows_at(journal, delta, positions[existing])
+    updates = latest_trades[existing].reset_index(drop=True)
+    updates["Notes"] = updates["Notes"].combine_first(old["Notes"])
+    updates["Ratio"] = updates["Ratio"].combine_first(old["Ratio"])
+
+    # Existing trades are rewritten only when a value differs.
+    unchanged = ((updates == old) | (updates.isna() & old.isna())).all(axis=1).to_numpy()
+    changed_rows = positions[existing][~unchanged]
+    changed = updates[~unchanged].set_axis(changed_rows)
+
+    # New trades are appended and only their keys are inserted into the index.
+    next_row = max(len(journal), int(delta.index.max()) + 1 if len(delta) else 0)
+    new_trades = latest_trades[~existing]
+    new_trades = new_trades.set_axis(np.arange(next_row, next_row + len(new_trades)))
+    if len(new_trades):
+        index = index.append(hashes[~existing], next_row)
+
+    parts = [part for part in (delta.drop(changed_rows, errors="ignore"), changed, new_trades) if len(part)]
+    if parts:
+        delta = pd.concat(parts)
+    return delta, index, len(changed_rows), len(new_trades)
 
+
+@timed("ingest")
+def update_trading_journal(latest_file, master_file=JOURNAL_FILE):
+    # Stream the upload in row blocks and merge each block as it is cleaned.
+    return commit_trades(iter_clean_trades(latest_file), master_file)
+
+
+@timed("batch ingest")
+def ingest_directory(folder, master_file=JOURNAL_FILE, pattern="*.xlsx", workers=None):
+    # Backfill: every export in `folder` is parsed in parallel and the
+    # deduplicated batch is committed to the journal once. Newer files win.
+    paths = [path for path in glob.glob(os.path.join(folder, pattern))
+             if not os.path.basename(path).startswith("~$")]
+    paths.sort(key=lambda path: (os.path.getmtime(path), path))
+    if not paths:
+        print("⚠️ No exports found in", folder)
+        return journal_token(master_file) if os.path.exists(master_file) else None
+    batch = clean_exports(paths, workers)
+    print(f"✅ Parsed {len(paths)} exports into {len(batch)} trades")
+    return commit_trades([batch], master_file)
+
+
+def commit_trades(trade_chunks, master_file=JOURNAL_FILE):
+    # Merges cleaned trade blocks into the journal as one commit and returns
+    # the new journal token (the old one when nothing changed). Commits to
+    # one journal run one at a time, across threads and processes.
+    with journal_lock(master_file):
+        return _commit_trades(trade_chunks, master_file)
+
+
+def _commit_trades(trade_chunks, master_file):
+    # Open or create the master journal. Only its footer and pending deltas
+    # are read here; merging reads the rows the upload matched.
+    try:
+        sync_master_journal(master_file)
+        journal = JournalRows(master_file)
+        previous_token = journal_token(master_file)
+        index = TradeIndex.load(master_file, previous_token)
     except FileNotFoundError:
         print("Master journal not found. Creating a new one.")
-        master_journal = pd.DataFrame(columns=[
-            "Date", "Name", "Action", "Quantity", "Price", "Value",
-            "Total Position PnL", "Ratio", "Notes"
-        ])
-    
-    # Normalize dates in the master journal as well.
-    master_journal["Date"] = pd.to_datetime(master_journal["Date"], errors='coerce')\
-                              .dt.tz_localize(None).dt.normalize()
-    
-    # Ensure required columns exist in both DataFrames.
-    required_columns = ["Date", "Name", "Action", "Quantity", "Price", "Value", "Total Position PnL", "Ratio", "Notes"]
-    for col in required_columns:
-        if col not in master_journal.columns:
-            master_journal[col] = None
-        if col not in latest_trades.columns:
-            latest_trades[col] = None
-
-    master_journal["Notes"] = master_journal["Notes"].astype(str).replace({"nan": np.nan, "None": np.nan})
-    latest_trades["Notes"] = latest_trades["Notes"].astype(str).replace({"nan": np.nan, "None": np.nan})
-    master_journal["Ratio"] = master_journal["Ratio"].astype(str).replace({"nan": np.nan, "None": np.nan})
-    latest_trades["Ratio"] = latest_trades["Ratio"].astype(str).replace({"nan": np.nan, "None": np.nan})
+        journal = JournalRows(master_file, empty_journal())
+        previous_token = None
+        index = None
     
-    # Drop duplicates from latest_trades based on trade key.
-    trade_key = ["Date", "Name", "Action", "Quantity", "Price"]
-    latest_trades = latest_trades.drop_duplicates(subset=trade_key, keep="last")
-    # Merge using a key based on Date, Name, Action, Quantity, and Price.
-    trade_key = ["Date", "Name", "Action", "Quantity", "Price"]
-    merged = pd.merge(
-        latest_trades,
-        master_journal,
-        on=trade_key,
-        how="left",
-        suffixes=('', '_old')
+    # A missing or stale trade-key index is rebuilt once from the journal.
+    rebuilt = index is None
+    deduplicated = 0
+    if rebuilt:
+        master_journal = journal.frame()
+        rows_before = len(master_journal)
+        master_journal = master_journal.drop_duplicates(subset=TRADE_KEY, keep="last").reset_index(drop=True)
+        index = TradeIndex.build(master_journal)
+        deduplicated = rows_before - len(master_journal)
+        journal = JournalRows(master_file, master_journal)
+
+    delta = empty_journal()
+    changed = added = 0
+    for latest_trades in trade_chunks:
+        delta, index, chunk_changed, chunk_added = merge_trades(journal, latest_trades, index, delta)
+        changed += chunk_changed
+        added += chunk_added
+
+    if not (changed or added or deduplicated):
+        if rebuilt and os.path.exists(master_file):
+            index.save(master_file, journal_token(master_file))
+        print("✅ No new or changed trades, journal left untouched")
+        return previous_token
+
+    # Trades older than the journal tail force a re-sort, which like
+    # deduplication or too many pending deltas means writing a new base.
+    delta = delta.sort_index()
+    appended = delta[delta.index >= len(journal)]
+    appended_dates = appended["Date"].dropna()
+    last_date = journal.last_date()
+    resorted = len(appended_dates) > 0 and (
+        not appended_dates.is_monotonic_increasing or (pd.notna(last_date) and appended_dates.iloc[0] < last_date)
     )
-    
-    # Preserve old Notes and Ratio if present.
-    merged["Notes"] = merged["Notes"].combine_first(merged["Notes_old"])
-    merged["Ratio"] = merged["Ratio"].combine_first(merged["Ratio_old"])
-    merged = merged[required_columns]
-    
-    # Merge back with the master journal and deduplicate.
-    combined = pd.concat([master_journal, merged], ignore_index=True)
-    combined = combined.drop_duplicates(subset=trade_key, keep="last")
-    
-    # Format the Date column as a uniform string.
-    # For example: "04-03-23 00:00"
-    combined["Date"] = pd.to_datetime(combined["Date"], errors='coerce')
-    combined = combined.sort_values("Date")
-    
-    # Save the updated master journal.
-    combined.to_excel(master_file, index=False)
-    upload_to_supabase(master_file)
-    print(f"✅ Trading journal updated and saved as {master_file}")
-  # print(master_file)
+    rewrite = resorted or deduplicated or not os.path.exists(master_file) or should_compact(master_file)
+
+    # The calendar cube adds the new trades and swaps the old versions of
+    # changed ones; order does not matter for its sums.
+    cube = None
+    if not deduplicated:
+        cube = read_rollup_cube(master_file, previous_token)
+        if cube is not None:
+            replaced = delta.index[delta.index < len(journal)].to_numpy()
+            cube = update_rollup_cube(cube, delta, journal.take(replaced))
+
+    if rewrite:
+        master_journal = apply_delta(journal.frame(), delta)
+        if resorted:
+            master_journal = master_journal.sort_values("Date", kind="stable").reset_index(drop=True)
+            index = TradeIndex.build(master_journal)
+        token = write_journal(master_journal, master_file)
+        written = [master_file]
+    else:
+        token = write_journal_delta(delta, master_file)
+        written = [journal_deltas(master_file)[-1]]
+    index.save(master_file, token)
+
+    # The daily equity series is extended when trades were only appended.
+    daily = None
+    if not (changed or resorted or deduplicated):
+        daily = read_daily_series(master_file, previous_token)
+        if daily is not None:
+            daily = append_daily_series(daily, appended)
+    current = None
+    if daily is None or cube is None:
+        current = master_journal if rewrite else apply_delta(journal.frame(), delta)
+    if daily is None:
+        daily = build_daily_series(current)
+    save_daily_series(master_file, daily, token)
+    if cube is None:
+        cube = build_rollup_cube(current)
+    save_rollup_cube(master_file, cube, token)
+
+    # The local commit is durable; the bucket upload happens in the background.
+    enqueue_journal_upload(master_file, written, changes=delta)
+    kind = "new base" if rewrite else "delta"
+    print(f"✅ Trading journal updated and saved as {master_file} ({added} new, {changed} changed, {kind})")
+    return token
+
+
+if __name__ == "__main__":
+    # python tradingjournal.py ingest <folder> [--workers N] [--pattern "*.xlsx"]
+    parser = argparse.ArgumentParser(description="Work with broker exports without the dashboard.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest_cmd = commands.add_parser("ingest", help="merge every export in a folder in one commit")
+    ingest_cmd.add_argument("folder")
+    ingest_cmd.add_argument("--journal", default=JOURNAL_FILE)
+    ingest_cmd.add_argument("--pattern", default="*.xlsx")
+    ingest_cmd.add_argument("--workers", type=int, help="parser processes (default: one per CPU)")
+    ingest_cmd.add_argument("--upload-timeout", type=float, default=120,
+                            help="seconds to wait for the bucket upload before leaving it queued")
+    # python tradingjournal.py lots <export.xlsx ...> [--method lifo]
+    lots_cmd = commands.add_parser("lots", help="rebuild positions from export fills (FIFO/LIFO)")
+    lots_cmd.add_argument("exports", nargs="+")
+    lots_cmd.add_argument("--method", choices=["fifo", "lifo"], default="fifo")
+    lots_cmd.add_argument("--output", help="write closes, open lots and the broker check to this .xlsx")
+    args = parser.parse_args()
+
+    if args.command == "lots":
+        from lots import export_fills, match_lots, open_exposure, position_check
+        fills = export_fills(args.exports)
+        closes, open_lots = match_lots(fills, args.method)
+        check = position_check(closes)
+        print(f"✅ {len(fills)} fills, {len(closes)} closing fills matched {args.method.upper()}")
+        print(f"Realized PnL: {closes['Realized PnL'].sum():.2f}, median holding period: {closes['Holding Period'].median()}")
+        print(f"Broker position PnL: {check['Broker PnL'].sum():.2f} ({check['Difference'].sum():.2f} not explained by fills, e.g. fees)")
+        unknown = closes["Realized PnL"].isna().sum()
+        if unknown:
+            print(f"⚠️ {unknown} closing fills sell lots opened before the first export; their PnL is unknown")
+        exposure = open_exposure(open_lots, fills)
+        if len(exposure):
+            print("Open exposure:")
+            print(exposure.to_string(index=False))
+        if args.output:
+            with pd.ExcelWriter(args.output) as writer:
+                closes.assign(**{"Holding Period": closes["Holding Period"].astype(str)}).to_excel(writer, sheet_name="Closes", index=False)
+                open_lots.to_excel(writer, sheet_name="Open Lots", index=False)
+                check.to_excel(writer, sheet_name="Broker Check", index=False)
+            print(f"✅ Wrote {args.output}")
+    else:
+        ingest_directory(args.folder, args.journal, args.pattern, args.workers)
+        if not get_upload_queue().drain(args.upload_timeout):
+            print("⚠️ Upload still pending; it is kept in the outbox and retried on the next start")
@@ -0,0 +1,167 @@
+import json
+import os
+import random
+import shutil
+import threading
+import time
+from storage import journal_lock
+
+# Commits waiting to be uploaded are kept on disk so a restart or a failed
+# transfer never loses them; a background thread drains the outbox.
+OUTBOX_DIR = ".journal_outbox"
+RETRY_BASE_SECONDS = 2
+RETRY_MAX_SECONDS = 300
+
+
+def _fsync_copy(src, dst):
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        shutil.copyfileobj(fsrc, fdst)
+        fdst.flush()
+        os.fsync(fdst.fileno())
+
+
+class UploadQueue:
+    def __init__(self, publish_fn, outbox_dir=OUTBOX_DIR):
+        # publish_fn(storage_path, files, payload) returns True on success;
+        # files maps object names to their durable copies in the outbox.
+        self.publish_fn = publish_fn
+        self.outbox_dir = outbox_dir
+        self.objects_dir = os.path.join(outbox_dir, "objects")
+        self.wake = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+    def outbox_lock(self):
+        # Held by every thread and process sharing the outbox while jobs are
+        # written, loaded or collected, so a job's files are never removed
+        # before the job itself is saved.
+        return journal_lock(os.path.join(self.outbox_dir, "outbox"))
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="journal-upload", daemon=True)
+                self.thread.start()
+        self.wake.set()
+
+    def enqueue(self, storage_path, files=None, payload=None):
+        # Copy the files into the outbox and record the job; returns once both
+        # are on disk. Files are immutable objects named by `files` keys.
+        files = files or {}
+        with self.outbox_lock():
+            job_id = self._new_job_id()
+            for name, local_path in files.items():
+                target = os.path.join(self.objects_dir, name)
+                if not os.path.exists(target):
+                    _fsync_copy(local_path, target + ".tmp")
+                    os.replace(target + ".tmp", target)
+            self._save_job({
+                "id": job_id,
+                "storage_path": storage_path,
+                "files": sorted(files),
+                "payload": payload,
+                "attempts": 0,
+                "next_try": 0,
+            })
+        self.start()
+        return job_id
+
+    def drain(self, timeout=None):
+        # Wait until the outbox is empty; False if jobs remain after timeout.
+        deadline = None if timeout is None else time.time() + timeout
+        while self.pending():
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(0.1)
+        return True
+
+    def pending(self, storage_path=None):
+        with self.outbox_lock():
+            jobs = self._jobs()
+        return [job for job in jobs if storage_path is None or job["storage_path"] == storage_path]
+
+    def _new_job_id(self):
+        # Under the outbox lock: newer than every queued job, including those
+        # of other processes, so the newest job per object is the last one.
+        queued = [int(name[:-len(".json")]) for name in os.listdir(self.outbox_dir) if name.endswith(".json")]
+        return f"{max([int(time.time() * 1000)] + [job_id + 1 for job_id in queued]):016d}"
+
+    def _job_path(self, job_id):
+        return os.path.join(self.outbox_dir, f"{job_id}.json")
+
+    def _save_job(self, job):
+        tmp_path = self._job_path(job["id"]) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(job, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._job_path(job["id"]))
+
+    def _remove_job(self, job):
+        try:
+            os.remove(self._job_path(job["id"]))
+        except FileNotFoundError:
+            pass
+
+    def _jobs(self):
+        jobs = []
+        for name in sorted(os.listdir(self.outbox_dir)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.outbox_dir, name)) as f:
+                    jobs.append(json.load(f))
+            except (FileNotFoundError, ValueError):
+                continue
+        return jobs
+
+    def _collect_garbage(self):
+        # Drop outbox objects no pending job refers to any more.
+        with self.outbox_lock():
+            referenced = {name for job in self._jobs() for name in job["files"]}
+            for name in os.listdir(self.objects_dir):
+                if name not in referenced and not name.endswith(".tmp"):
+                    os.remove(os.path.join(self.objects_dir, name))
+
+    def _next_job(self):
+        # Each job publishes the whole current state of its object, so only
+        # the newest job per object matters; it inherits the files of the
+        # jobs it replaces.
+        latest = {}
+        with self.outbox_lock():
+            for job in self._jobs():
+                previous = latest.get(job["storage_path"])
+                if previous is not None:
+                    job["files"] = sorted(set(job["files"]) | set(previous["files"]))
+                    self._save_job(job)
+                    self._remove_job(previous)
+                latest[job["storage_path"]] = job
+        if not latest:
+            return None, None
+        job = min(latest.values(), key=lambda j: j["next_try"])
+        return job, max(0.0, job["next_try"] - time.time())
+
+    def _run(self):
+        while True:
+            job, delay = self._next_job()
+            if job is None or delay > 0:
+                self.wake.wait(timeout=delay)
+                self.wake.clear()
+                continue
+
+            files = {name: os.path.join(self.objects_dir, name) for name in job["files"]}
+            if self.publish_fn(job["storage_path"], files, job["payload"]):
+                self._remove_job(job)
+                self._collect_garbage()
+                continue
+
+            # Exponential backoff with a little jitter.
+            job["attempts"] += 1
+            backoff = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (job["attempts"] - 1))
+            job["next_try"] = time.time() + backoff * random.uniform(0.8, 1.2)
+            print(f"⚠️ Upload of {job['storage_path']} failed, retry {job['attempts']} in {backoff:.0f}s")
+            with self.outbox_lock():
+                # A newer job may have taken this one's place meanwhile.
+                if os.path.exists(self._job_path(job["id"])):
+                    self._save_job(job)
@@ -1,16 +1,17 @@
+import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
 
-def plot_equity(df):
-    df = df.copy()
-    df["Date"] = df["Date"].dt.date
-    daily = df.groupby("Date")["Total Position PnL"].sum().reset_index()
-    daily["Cumulative PnL"] = daily["Total Position PnL"].cumsum()
+# Both charts take a window of the precomputed daily series (daily_series.py).
+# Downsampled series are drawn with WebGL traces.
 
+def plot_equity(daily, webgl=False):
+    scatter = go.Scattergl if webgl else go.Scatter
     fig = go.Figure()
-    fig.add_trace(go.Scatter(
+    fig.add_trace(scatter(
         x=daily["Date"],
         y=daily["Cumulative PnL"],
-        mode="lines+markers",
+        mode="lines" if webgl else "lines+markers",
         line=dict(color="#00BFFF", width=3),
         marker=dict(size=5),
         hovertemplate="Date: %{x}<br>Cumulative PnL: %{y:.2f}<extra></extra>"
@@ -26,16 +27,10 @@ def plot_equity(df):
     return fig
 
 
-def plot_drawdown(df):
-    df = df.copy()
-    df["Date"] = df["Date"].dt.date
-    daily = df.groupby("Date")["Total Position PnL"].sum().reset_index()
-    daily["Cumulative PnL"] = daily["Total Position PnL"].cumsum()
-    daily["Running Peak"] = daily["Cumulative PnL"].cummax()
-    daily["Drawdown"] = daily["Cumulative PnL"] - daily["Running Peak"]
-
+def plot_drawdown(daily, webgl=False):
+    scatter = go.Scattergl if webgl else go.Scatter
     fig = go.Figure()
-    fig.add_trace(go.Scatter(
+    fig.add_trace(scatter(
         x=daily["Date"],
         y=daily["Drawdown"],
         mode="lines",
@@ -51,3 +46,76 @@ def plot_drawdown(df):
         height=400
     )
     return fig
+
+
+def plot_calendar_heatmap(days, year):
+    # Daily PnL of one year as weekday rows by ISO-week columns, the day
+    # level of the rollup cube (rollups.py).
+    days = days[days.index.year == year]
+    # Columns count weeks from the Monday on or before Jan 1, numbered like
+    # ISO weeks; days of last year's last ISO week get 0 and late-December
+    # days of next year's week 1 get one past the year's last week.
+    dates = days.index.to_numpy(dtype="datetime64[D]")
+    jan1 = np.datetime64(f"{year}-01-01", "D")
+    weekday = (dates.view(np.int64) + 3) % 7
+    first_monday = jan1 - (jan1.view(np.int64) + 3) % 7
+    week = (dates - first_monday).astype(np.int64) // 7 + (1 if (jan1.view(np.int64) + 3) % 7 < 4 else 0)
+    grid = pd.DataFrame({"weekday": weekday, "week": week, "PnL": days["PnL"].to_numpy(),
+                         "Trades": days["Trades"].to_numpy(), "Date": days.index.strftime("%Y-%m-%d")})
+    z = grid.pivot(index="weekday", columns="week", values="PnL").reindex(range(7))
+    text = grid.assign(label=grid["Date"] + "<br>Trades: " + grid["Trades"].astype(str)) \
+        .pivot(index="weekday", columns="week", values="label").reindex(range(7))
+    fig = go.Figure(go.Heatmap(
+        x=z.columns,
+        y=["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"],
+        z=z.to_numpy(),
+        text=text.to_numpy(),
+        colorscale="RdYlGn",
+        zmid=0,
+        xgap=2,
+        ygap=2,
+        hovertemplate="%{text}<br>PnL: %{z:.2f}<extra></extra>",
+    ))
+    fig.update_layout(
+        title=f"🗓️ Daily PnL in {year}",
+        xaxis_title="ISO week",
+        yaxis=dict(autorange="reversed"),
+        template="plotly_dark",
+        height=300
+    )
+    return fig
+
+
+def plot_rolling(rolling, metric, daily, webgl=False):
+    # One rolling metric (rolling.py) over the equity curve on a second axis.
+    scatter = go.Scattergl if webgl else go.Scatter
+    fig = go.Figure()
+    fig.add_trace(scatter(
+        x=daily["Date"],
+        y=daily["Cumulative PnL"],
+        name="Cumulative PnL",
+        mode="lines",
+        line=dict(color="#00BFFF", width=1),
+        opacity=0.35,
+        yaxis="y2",
+        hovertemplate="Cumulative PnL: %{y:.2f}<extra></extra>",
+    ))
+    fig.add_trace(scatter(
+        x=rolling["Date"],
+        y=rolling[metric],
+        name=metric,
+        mode="lines",
+        line=dict(color="orange", width=2),
+        hovertemplate=f"{metric}: %{{y:.2f}}<extra></extra>",
+    ))
+    fig.update_layout(
+        title=f"📐 Rolling {metric}",
+        xaxis_title="Date",
+        yaxis=dict(title=metric),
+        yaxis2=dict(title="Cumulative PnL", overlaying="y", side="right", showgrid=False),
+        hovermode="x unified",
+        showlegend=False,
+        template="plotly_dark",
+        height=400
+    )
+    return fig